@@ -0,0 +1,191 @@
+# Benchmarks for gplot.py
+
+'''
+Usage:
+   python bench_gplot.py [import] [transport] [options]
+
+import    : Time of "import gplot" in a fresh interpreter (best and median of
+            several runs). It also checks that the import does not probe or start
+            gnuplot.
+transport : Data transports (tmp='$', None, '', '-', 'binary', 'shm') for a
+            headless terminal (default: unknown). Each case (transport, points,
+            columns, curves) runs in a new gnuplot process and reports
+              serialize : time to format/store the data (Gjob, no gnuplot) [s]
+              write     : time until the pipe write returned [s]
+              latency   : time until gnuplot confirmed the plot (marker) [s]
+              bytes     : payload (commands, inline and file data)
+              throughput: bytes / latency [MB/s]
+              rss_gnuplot : peak RSS of the gnuplot process [kB] (Linux)
+              rss_python  : peak RSS of this process so far [kB]
+
+Options:
+   --sizes 1e2,1e3,...  number of points (default: 1e2 to 1e7)
+   --cols 2             number of columns per curve (comma separated list)
+   --curves 1           number of curves (comma separated list)
+   --tmp '$,-'          transports (comma separated; None is "None")
+   --term unknown       gnuplot terminal, e.g. dumb
+   --repeat 3           best of repeat
+   --json file          write the results as JSON (default: stdout)
+
+Example:
+   python bench_gplot.py transport --sizes 1e2,1e4,1e6 --tmp '$,None,binary' --json bench.json
+
+'''
+from __future__ import print_function
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+
+def bench_import(n=10):
+   # each run in a new interpreter, otherwise the module is cached
+   code = ('import time; t = time.time(); import gplot; t = time.time() - t; '
+           'print(t, "version" in gplot.Gplot.__dict__ and isinstance(gplot.Gplot.__dict__["version"], gplot._classlazy), '
+           'gplot.gplot._obj is None)')
+   env = dict(os.environ, PYTHONPATH=here+os.pathsep+os.environ.get('PYTHONPATH', ''))
+   times = []
+   for i in range(n):
+      out = subprocess.check_output([sys.executable, '-c', code], env=env, universal_newlines=True).split()
+      times.append(float(out[0]))
+      if out[1:] != ['True', 'True']:
+         raise RuntimeError('import probed gnuplot (version lazy, default instance lazy): %s' % out[1:])
+   times.sort()
+   print('import gplot: best %.1f ms, median %.1f ms (n=%d)' % (1000*times[0], 1000*times[n//2], n), file=sys.stderr)
+   return {'best': times[0], 'median': times[n//2], 'n': n}
+
+
+def _peakrss(pid):
+   # peak resident set size [kB] of a process (Linux only)
+   try:
+      with open('/proc/%d/status' % pid) as f:
+         return int(re.search(r'VmHWM:\s*(\d+)', f.read()).group(1))
+   except (IOError, OSError, AttributeError):
+      return None
+
+def _selfrss():
+   try:
+      import resource
+   except ImportError:
+      return None
+   rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+   return rss // 1024 if sys.platform == 'darwin' else rss   # bytes on mac
+
+
+def _args(n, cols, curves):
+   # curves with n points and cols columns for the call method
+   import numpy as np
+   x = np.arange(n, dtype=float)
+   args = ()
+   for k in range(curves):
+      args += (x,) + tuple(np.random.rand(n) for j in range(cols-1)) + ('w l' + (',' if k < curves-1 else ''),)
+   return args
+
+
+def _payload(script):
+   # commands and inline data plus the referenced data files
+   size = len(script)
+   for name in set(re.findall(r'"([^"$]+)"', script)):
+      if os.path.isfile(name):
+         size += os.path.getsize(name)
+   return size
+
+
+def bench_case(tmp, n, cols=2, curves=1, term='unknown', repeat=3):
+   import gplot
+   args = _args(n, cols, curves)
+   # serialization only (recorded, no gnuplot)
+   serialize = float('inf')
+   for i in range(repeat):
+      job = gplot.Gjob(tmp=tmp)
+      t0 = time.time()
+      job(*args)
+      serialize = min(serialize, time.time()-t0)
+   nbytes = _payload(''.join(job.script))
+   del job
+
+   # end-to-end in a new gnuplot
+   g = gplot.Gplot(tmp=tmp, stderr=subprocess.PIPE)
+   g.term(term)
+   write = latency = float('inf')
+   for i in range(repeat):
+      g.put = g._put   # no marker per command
+      t0 = time.time()
+      g(*args)
+      t1 = time.time()
+      g._check()   # gnuplot has finished the plot
+      t2 = time.time()
+      write, latency = min(write, t1-t0), min(latency, t2-t0)
+   rss = _peakrss(g.pid)
+   g.put('exit')
+   g.gnuplot.wait()
+   return {'tmp': tmp, 'n': n, 'cols': cols, 'curves': curves, 'term': term,
+           'serialize': serialize, 'write': write, 'latency': latency, 'bytes': nbytes,
+           'throughput': nbytes / latency / 1e6,
+           'rss_gnuplot': rss, 'rss_python': _selfrss()}
+
+
+def bench_transport(sizes, cols=(2,), curves=(1,), tmps=('$', None, '', '-', 'binary', 'shm'), term='unknown', repeat=3):
+   import gplot
+   results = []
+   cwd = os.getcwd()
+   tmpdir = tempfile.mkdtemp(prefix='bench_gplot_')
+   os.chdir(tmpdir)   # tmp='' writes local files
+   try:
+      for tmp in tmps:
+         if tmp == 'shm' and not gplot._shmdir:
+            continue
+         for k in curves:
+            for c in cols:
+               for n in sizes:
+                  r = bench_case(tmp, n, c, k, term, repeat)
+                  results.append(r)
+                  print('tmp=%-8r n=%-9d cols=%d curves=%d  serialize %8.4f s  write %8.4f s  latency %8.4f s  %7.1f MB/s  %s kB' %
+                        (tmp, n, c, k, r['serialize'], r['write'], r['latency'], r['throughput'], r['rss_gnuplot']), file=sys.stderr)
+   finally:
+      os.chdir(cwd)
+      for name in os.listdir(tmpdir):
+         os.remove(os.path.join(tmpdir, name))
+      os.rmdir(tmpdir)
+   return results
+
+
+def _list(s, conv=int):
+   return [conv(float(x)) if conv is int else conv(x) for x in s.split(',')]
+
+def _tmp(s):
+   return None if s == 'None' else s
+
+
+if __name__ == "__main__":
+   sys.path.insert(0, here)
+   parser = argparse.ArgumentParser(description='Benchmarks for gplot.py')
+   parser.add_argument('what', nargs='*', default=['import'], help='import, transport')
+   parser.add_argument('--sizes', default='1e2,1e3,1e4,1e5,1e6,1e7', type=_list)
+   parser.add_argument('--cols', default='2', type=_list)
+   parser.add_argument('--curves', default='1', type=_list)
+   parser.add_argument('--tmp', default='$,None,,-,binary,shm', type=lambda s: _list(s, _tmp))
+   parser.add_argument('--term', default='unknown')
+   parser.add_argument('--repeat', default=3, type=int)
+   parser.add_argument('--json', help='output file (default: stdout)')
+   opt = parser.parse_args()
+
+   results = {'python': sys.version.split()[0], 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+   if 'import' in opt.what:
+      results['import'] = bench_import()
+   if 'transport' in opt.what:
+      results['transport'] = bench_transport(opt.sizes, opt.cols, opt.curves, opt.tmp, opt.term, opt.repeat)
+      import gplot
+      results['gnuplot'] = gplot.Gplot.version
+
+   if opt.json:
+      with open(opt.json, 'w') as f:
+         json.dump(results, f, indent=1)
+   else:
+      print(json.dumps(results, indent=1))
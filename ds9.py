@@ -1,6 +1,9 @@
 from __future__ import print_function
 
+import shlex
 import subprocess
+import sys
+import threading
 import numpy as np
 
 try:
@@ -20,13 +23,155 @@ def checkport(func):
         return func(self, *args, **kwargs)
     return wrap
 
+class XPA(object):
+   """
+   Persistent XPA connections to ds9 (libxpa via ctypes).
+
+   Each port gets its own handle (XPAOpen), which keeps the connection to the access
+   point open between the commands, i.e. no process spawn and no reconnect per command.
+   The handles are locked per port, so threads can share them.
+   Without libxpa, the xpaset, xpaget, and xpaaccess commands are spawned (no shell).
+   fake_xpa.FakeXPA is a stand-in for libxpa and ds9 (lib=FakeXPA()), e.g. for tests.
+
+   Examples
+   --------
+   >>> xpa = XPA()
+   >>> xpa.access('pyds9')
+   True
+   >>> xpa.set('pyds9', 'cmap bb')   # the error messages
+   ''
+   >>> xpa.get('pyds9', 'fits height')
+   b'5\\n'
+
+   """
+   def __init__(self, lib=None):
+      self._lib = lib   # None: load on first use, False: spawn the commands
+      self._handles = {}   # port -> [handle, lock]
+      self._lock = threading.Lock()
+
+   @property
+   def lib(self):
+      if self._lib is None:
+         self._lib = _libxpa()
+      return self._lib
+
+   def _call(self, func, port, *args):
+      # func(handle, template, *args) with the handle of the port
+      with self._lock:
+         if port not in self._handles:
+            self._handles[port] = [self.lib.XPAOpen(None), threading.Lock()]
+         entry = self._handles[port]
+      with entry[1]:
+         return func(entry[0], port.encode(), *args)
+
+   def _results(self, n, names, messages, bufs=None, lens=None):
+      # copy and free the results of libxpa; returns the data and the error messages
+      import ctypes
+      data, errors = [], []
+      for i in range(n):
+         if bufs is not None and bufs[i]:
+            data.append(ctypes.string_at(bufs[i], lens[i]))
+         if messages[i]:
+            errors.append(ctypes.string_at(messages[i]).decode('latin1'))
+         for ptr in (names[i], messages[i], bufs[i] if bufs is not None else None):
+            if ptr:
+               self.lib.free(ptr)
+      return data, errors
+
+   def set(self, port, cmd, data=None):
+      """xpaset (with data) or xpaset -p (without). Returns the error messages."""
+      if data is not None and not isinstance(data, bytes):
+         data = data.encode()
+      if not self.lib:
+         try:
+            if data is None:
+               p = subprocess.Popen(['xpaset', '-p', port] + shlex.split(cmd), stderr=subprocess.PIPE)
+            else:
+               p = subprocess.Popen(['xpaset', port] + shlex.split(cmd), stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+         except OSError as e:
+            return 'xpaset: %s' % e   # not installed
+         return p.communicate(data)[1].decode('latin1')
+      import ctypes
+      names, messages = (ctypes.c_void_p*1)(), (ctypes.c_void_p*1)()
+      n = self._call(self.lib.XPASet, port, cmd.encode(), None, data, len(data or b''), names, messages, 1)
+      return '\n'.join(self._results(n, names, messages)[1])
+
+   def get(self, port, cmd):
+      """xpaget; returns the data as bytes."""
+      if not self.lib:
+         try:
+            return subprocess.Popen(['xpaget', port] + shlex.split(cmd), stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0]
+         except OSError as e:
+            print('xpaget: %s' % e, file=sys.stderr)   # not installed
+            return b''
+      import ctypes
+      bufs, lens = (ctypes.c_void_p*1)(), (ctypes.c_size_t*1)()
+      names, messages = (ctypes.c_void_p*1)(), (ctypes.c_void_p*1)()
+      n = self._call(self.lib.XPAGet, port, cmd.encode(), None, bufs, lens, names, messages, 1)
+      data, errors = self._results(n, names, messages, bufs, lens)
+      return b''.join(data)
+
+   def access(self, port):
+      """True, if the access point (a ds9 with this port) exists."""
+      if not self.lib:
+         try:
+            out = subprocess.Popen(['xpaaccess', '-n', port], stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0]
+         except OSError:
+            return False
+         return int(out or 0) > 0
+      import ctypes
+      names, messages = (ctypes.c_void_p*1)(), (ctypes.c_void_p*1)()
+      n = self._call(self.lib.XPAAccess, port, None, None, names, messages, 1)
+      data, errors = self._results(n, names, messages)
+      return n > 0 and not errors
+
+   def close(self):
+      """Close the connections."""
+      with self._lock:
+         for handle, lock in self._handles.values():
+            self.lib.XPAClose(handle)
+         self._handles.clear()
+
+
+def _libxpa():
+   # libxpa with the prototypes; False, if it is not installed
+   import ctypes
+   import ctypes.util
+   for name in ('libxpa.so.1', 'libxpa.so', 'libxpa.dylib', ctypes.util.find_library('xpa')):
+      try:
+         # CDLL(None) would be the process itself (find_library found nothing)
+         lib = ctypes.CDLL(name) if name else None
+         if hasattr(lib, 'XPAOpen'):
+            break
+      except OSError:
+         pass
+   else:
+      return False
+   P, S, I = ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int
+   lib.XPAOpen.restype = P
+   lib.XPAOpen.argtypes = [S]
+   lib.XPAClose.argtypes = [P]
+   lib.XPASet.argtypes = [P, S, S, S, S, ctypes.c_size_t, P, P, I]
+   lib.XPAGet.argtypes = [P, S, S, S, P, P, P, P, I]
+   lib.XPAAccess.argtypes = [P, S, S, S, P, P, I]
+   lib.free.argtypes = [P]   # of libc (a dependency); the results are malloced by libxpa
+   return lib
+
+xpa = XPA()
+
+def xpaset(port, cmd, data=None):
+   # xpa.set with the errors of XPA to stderr (as the xpaset command)
+   msg = xpa.set(port, cmd, data)
+   if msg:
+      print(msg, file=sys.stderr)
+
 def set_frame(frame, port):
     if frame is None:
         return
     elif frame > 0:
-        subprocess.call('xpaset -p '+port+' frame %s'%frame, shell=True)
+        xpaset(port, 'frame %s'%frame)
     elif frame == 0:
-        subprocess.call('xpaset -p '+port+' frame new', shell=True)
+        xpaset(port, 'frame new')
     else:
         pass   # all negative currently to the current frame
 
@@ -75,15 +220,16 @@ class DS9:
 #         subprocess.call('xpaset -p %s %s' % (port, args), shell=True)
        if 'frame' in kwargs:
            set_frame(kwargs.pop('frame'), kwargs.get('port', self.port))
-       subprocess.call('xpaset -p '+kwargs.get('port', self.port) + " %s"*len(args) % args, shell=True)
+       xpaset(kwargs.get('port', self.port), " ".join(map(str, args)))
    def get(self, *args, **kwargs):
-       result, status = subprocess.Popen("xpaget "+kwargs.get('port',self.port)+" %s"*len(args) % args, shell=True, stdout=subprocess.PIPE, stderr= subprocess.PIPE, universal_newlines=True, bufsize=0).communicate()
-       return result
+       # raw=True returns bytes
+       result = xpa.get(kwargs.get('port', self.port), " ".join(map(str, args)))
+       return result if kwargs.get('raw') else result.decode('latin1')
    def get_array(self, *args, **kwargs):
        h = int(self.get('fits height'))
        bitpix = int(self.get('fits bitpix'))
        dt = {8:'bool', 64:'int64', 32:'int32', 16:'uint16', -64:'float64', -32:'float32'}[bitpix]
-       data = np.frombuffer(self.get('array', *args, **kwargs), dtype=dt)
+       data = np.frombuffer(self.get('array', *args, raw=True, **kwargs), dtype=dt)
        return data.reshape((h,-1))
    def __getattr__(self, name):
       # generic translatation, e.g. ds9.cmap sends "cmap"
@@ -140,9 +286,7 @@ def _ds9(data, tmpfile='-', port='pyds9', obj=None, frame=0):
       hdu.writeto(tmpfile, clobber=True)
       subprocess.call('xds9 -p '+port+' '+tmpfile+' &', shell=True)
 
-   ports, xpamiss = subprocess.Popen("xpaget xpans | grep 'DS9 "+port+" '", shell=True, stdout=subprocess.PIPE, stderr= subprocess.PIPE, universal_newlines=True, bufsize=0).communicate()
-
-   if ports == '':
+   if not xpa.access(port):
       # switch to normal start and create a new port
       if tmpfile == '-':
          pipeds9 = subprocess.Popen(['ds9 -tcl yes -analysis ~/.ds9.ans -title '+port+" -port 0 -array -'["+dim+"]' "], shell=True, stdin=subprocess.PIPE)
@@ -156,16 +300,13 @@ def _ds9(data, tmpfile='-', port='pyds9', obj=None, frame=0):
       set_frame(frame, port)
 
       if tmpfile == '-':
-         pipeds9 = subprocess.Popen(['xpaset '+port+" array -'["+dim+"']"], shell=True, stdin=subprocess.PIPE)
-         #data.tofile(pipeds9.stdin)
-         pipeds9.stdin.write(data.tobytes())
-         pipeds9.stdin.close()
+         xpaset(port, "array -["+dim+"]", data.tobytes())
       else:
-         subprocess.call('xpaset -p '+port+' fits '+tmpfile+' &', shell=True)
+         xpaset(port, 'fits '+tmpfile)
 
    if obj:
        # xpaset pyds9 wcs append <<< "OBJECT = 'GJ699'"
-       result, status = subprocess.Popen("xpaset "+port+" wcs append", shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE, universal_newlines=True, bufsize=0).communicate("OBJECT = '%s'" % obj)
+       xpaset(port, "wcs append", "OBJECT = '%s'" % obj)
 
 
 def ds9msk(mask, bx=None, by=None, limit=15000, box=True, **kwargs):
@@ -340,9 +481,7 @@ def ods9(cx, cy, arg1=None, arg2=None, port='pyds9', frame=None, lastframe=False
    lines = "\n".join(header + coord + lines)
 
    # check if the port exists
-   ports, xpamiss = subprocess.Popen("xpaget xpans | grep 'DS9 "+port+"'", shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, bufsize=0).communicate()
-
-   if ports == '':
+   if not xpa.access(port):
       print('xpa misses: ', port)
       return
 
@@ -351,7 +490,7 @@ def ods9(cx, cy, arg1=None, arg2=None, port='pyds9', frame=None, lastframe=False
    #if keyword_set(frame) then $
       #spawn, 'xpaset -p '+port+' frame '+string(frame)
    if frame: ds9.frame(frame, port=port)
-   if clear: subprocess.call('xpaset -p '+port+' regions delete all', shell=True)
+   if clear: xpaset(port, 'regions delete all')
 
    if not regfile:
    #if ~keyword_set(regfile) then begin
@@ -363,8 +502,7 @@ def ods9(cx, cy, arg1=None, arg2=None, port='pyds9', frame=None, lastframe=False
       #; flush, ounit ; does this helps ?
       #free_lun, ounit
       #print(lines)
-      pipeds9 = subprocess.Popen(['xpaset '+port+' regions'], shell=True, stdin=subprocess.PIPE, universal_newlines=True, bufsize=0)  # This line is needed for python3! Unbuffered and to pass str )
-      pipeds9.communicate(lines)
+      xpaset(port, 'regions', lines)
    elif regfile == '-':
       print(lines)
    else:
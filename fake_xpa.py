@@ -0,0 +1,142 @@
+'''
+A stand-in for libxpa and ds9, to exercise ds9.py without ds9 and XPA.
+
+>>> import ds9, fake_xpa
+>>> ds9.xpa = ds9.XPA(lib=fake_xpa.FakeXPA())
+>>> ds9.ds9.cmap('bb')
+>>> ds9.ds9.get('cmap')
+'bb\\n'
+
+Run as script for a self-check: python fake_xpa.py
+'''
+from __future__ import print_function
+
+__author__ = 'Mathias Zechmeister'
+__version__ = '2026-10-18'
+
+import ctypes
+import re
+
+import numpy as np
+
+
+class FakeXPA(object):
+   """
+   The libxpa functions of ds9.XPA (XPAOpen, XPAClose, XPASet, XPAGet, XPAAccess, free)
+   in Python, backed by a minimal ds9.
+
+   A set stores the value for the parameter (the first word; "frame" and "regions" also
+   count and collect), a get returns it. An array sent with "array -[xdim=..,ydim=..,
+   bitpix=..]" is returned by "array", "fits height", and "fits bitpix".
+
+   Parameters
+   ----------
+   ports : list of str, optional
+       The access points (ds9 instances). Default is ['pyds9'].
+
+   Attributes
+   ----------
+   log : list of (port, paramlist, data)
+       All set commands.
+   handles : int
+       Number of opened handles (XPAOpen).
+   """
+   def __init__(self, ports=('pyds9',)):
+      self.ports = {port: {'values': {}, 'frames': 1, 'regions': [], 'array': None} for port in ports}
+      self.log = []
+      self.handles = 0
+      self._mem = {}   # address -> buffer, until free
+
+   def _alloc(self, data):
+      buf = ctypes.create_string_buffer(data, len(data)+1)
+      self._mem[ctypes.addressof(buf)] = buf
+      return ctypes.addressof(buf)
+
+   def free(self, ptr):
+      self._mem.pop(ptr, None)
+
+   def XPAOpen(self, mode):
+      self.handles += 1
+      return self.handles
+
+   def XPAClose(self, handle):
+      pass
+
+   def _reply(self, template, names, messages):
+      # the access point of the template, or an error message
+      port = template.decode()
+      names[0] = self._alloc(template)
+      if port not in self.ports:
+         messages[0] = self._alloc(b'XPA$ERROR no access points match template: ' + template)
+         return None
+      messages[0] = None
+      return self.ports[port]
+
+   def XPASet(self, handle, template, paramlist, mode, buf, size, names, messages, n):
+      ds9 = self._reply(template, names, messages)
+      param = paramlist.decode()
+      self.log.append((template.decode(), param, buf))
+      if ds9 is None:
+         return 1
+      key, _, value = param.partition(' ')
+      if key == 'frame':
+         ds9['frames'] += value == 'new'
+      elif key == 'regions':
+         if value == 'delete all':
+            ds9['regions'] = []
+         elif buf:
+            ds9['regions'].append(buf.decode())
+      elif key == 'array':
+         dim = dict(re.findall(r'(\w+)=(-?\w+)', value))
+         dt = {'8': 'bool', '64': 'int64', '32': 'int32', '16': 'uint16', '-16': 'int16', '-64': 'float64', '-32': 'float32'}[dim['bitpix']]
+         dt = np.dtype(dt).newbyteorder({'little': '<', 'big': '>'}.get(dim.get('endian'), '='))
+         ds9['array'] = np.frombuffer(buf, dtype=dt).reshape(int(dim.get('ydim', 1)), int(dim['xdim']))
+         ds9['bitpix'] = dim['bitpix']
+      else:
+         ds9['values'][key] = value
+      return 1
+
+   def XPAGet(self, handle, template, paramlist, mode, bufs, lens, names, messages, n):
+      ds9 = self._reply(template, names, messages)
+      if ds9 is None:
+         bufs[0], lens[0] = None, 0
+         return 1
+      param = paramlist.decode()
+      if param == 'array':
+         data = ds9['array'].tobytes()
+      elif param == 'fits height':
+         data = ('%d\n' % len(ds9['array'])).encode()
+      elif param == 'fits bitpix':
+         data = ('%s\n' % ds9['bitpix']).encode()
+      elif param == 'frame':
+         data = ('%d\n' % ds9['frames']).encode()
+      elif param == 'regions':
+         data = '\n'.join(ds9['regions']).encode()
+      else:
+         data = (ds9['values'].get(param, '') + '\n').encode()
+      bufs[0], lens[0] = self._alloc(data), len(data)
+      return 1
+
+   def XPAAccess(self, handle, template, paramlist, mode, names, messages, n):
+      if template.decode() not in self.ports:
+         return 0
+      names[0], messages[0] = self._alloc(template), None
+      return 1
+
+
+if __name__ == "__main__":
+   # self-check of ds9.py against the stand-in
+   import ds9
+   fake = FakeXPA()
+   ds9.xpa = ds9.XPA(lib=fake)
+   arr = np.arange(20, dtype=np.float64).reshape(5, 4)
+   ds9.ds9(arr)
+   assert (ds9.ds9.get_array() == arr).all()
+   ds9.ds9.cmap('bb')
+   assert ds9.ds9.get('cmap') == 'bb\n'
+   ds9.ods9([0, 5, 2], [0, 5, 4], clear=True)
+   assert ds9.ds9.get('regions') == 'cross point(1,1)\ncross point(6,6)\ncross point(3,5)'
+   assert ds9.xpa.access('pyds9') and not ds9.xpa.access('other')
+   ds9.ds9.cmap('bb', port='other')   # prints the error of XPA
+   assert fake.handles == 2 and not fake._mem
+   print('ok:', len(fake.log), 'commands,', fake.handles, 'handles')
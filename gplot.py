@@ -2,14 +2,412 @@
 
 from __future__ import print_function
 import subprocess
-from numpy import savetxt
+import sys
+import re
+import itertools
+import multiprocessing
+import hashlib
+import mmap
+import numbers
+import signal
+import threading
+import weakref
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+try:
+   from queue import Queue, Empty
+except ImportError:   # python 2
+   from Queue import Queue, Empty
+import numpy as np
 import tempfile
 import os
+import shutil
+import time
 
 __author__ = 'Mathias Zechmeister'
 __version__ = 'v17'
 __date__ = '2021-03-30'
-__all__ = ['gplot', 'Gplot', 'ogplot', 'Iplot']
+__all__ = ['gplot', 'Gplot', 'ogplot', 'Iplot', 'Gjob', 'Gpool', 'Gmultiplot', 'Gserver', 'Gstream', 'GnuplotError']
+
+
+def _datakey(data, *extra):
+   # content hash of the columns (buffer, shape, dtype); None for python objects
+   h = hashlib.sha1(repr(extra).encode())
+   for col in data:
+      col = np.asarray(col)
+      if col.dtype.kind == 'O':
+         return None
+      h.update(('%s%s' % (col.dtype.str, col.shape)).encode())
+      # in windows, strided and memory-mapped columns are not copied at once
+      for part in [col[i:i+2**16] for i in range(0, len(col), 2**16)] if col.ndim == 1 else [col]:
+         h.update(np.ascontiguousarray(part).view(np.uint8))
+   return h.hexdigest()
+
+def _columns(arg, fields=None):
+   # the columns of a structured array, record array, or DataFrame as arrays without copy
+   # (field views, strided); fields selects and orders them by name or position
+   # returns None for other arguments
+   names = getattr(getattr(arg, 'dtype', None), 'names', None)
+   if names:
+      get = lambda name: arg[name]
+   elif hasattr(arg, 'columns') and hasattr(arg, 'iloc'):   # pandas
+      names = list(arg.columns)
+      get = lambda name: np.asarray(arg[name])
+   else:
+      return None
+   fields = names if fields is None else [names[f] if isinstance(f, numbers.Integral) else f for f in fields]
+   return [get(name) for name in fields]
+
+def _argcols(arg, fields=None):
+   # the data columns of a call argument; structured arrays and DataFrames by field,
+   # 2D arrays and nested lists by row, 1D as one column, scalars as a column of length 1
+   cols = _columns(arg, fields)
+   if cols is None:
+      _1D = hasattr(arg, '__iter__')
+      _2D = _1D and hasattr(arg[0], '__iter__') and not isinstance(arg[0], str)
+      cols = tuple(arg) if _2D else (arg,) if _1D else ([arg],)
+   return tuple(cols)
+
+def _decimate(data, bins, xrange=None):
+   # reduce a curve to the rows of the min/max in each of the bins (envelope);
+   # x is the first column and assumed to be sorted; 1D data gets the index as x
+   cols = [np.asarray(col) for col in data]
+   if any(col.dtype.kind not in 'biuf' for col in cols):
+      return data
+   n = min(len(col) for col in cols)
+   if len(cols) == 1:
+      cols = [np.arange(n)] + cols
+   cols = [col[:n] for col in cols]
+   if xrange:
+      # keep a neighbour on each side to connect the lines to the border
+      i0, i1 = np.searchsorted(cols[0], xrange[0]), np.searchsorted(cols[0], xrange[1], 'right')
+      i0, i1 = max(i0-1, 0), min(i1+1, n)
+      cols = [col[i0:i1] for col in cols]
+      n = i1 - i0
+   if n <= 2*bins:
+      return tuple(cols)
+   per = -(-n // bins)
+   m = n // per * per
+   off = np.arange(0, m, per)
+   idx = [[0, n-1]]
+   for y in cols[1:]:
+      Y = y[:m].reshape(-1, per)
+      idx += [off+Y.argmin(1), off+Y.argmax(1)]
+      if m < n:
+         idx += [[m+y[m:].argmin(), m+y[m:].argmax()]]
+   idx = np.unique(np.concatenate(idx))
+   return tuple(col[idx] for col in cols)
+
+class GnuplotError(Exception):
+   '''Error reported by gnuplot.'''
+
+def _readuntil(f, marker):
+   # read gnuplot's stderr up to the marker line (requested via printerr)
+   lines = []
+   for line in iter(f.readline, ''):
+      if line.rstrip('\n') == marker:
+         break
+      lines.append(line)
+   return ''.join(lines)
+
+def _readpipe(fd, marker, out):
+   # read a figure from the pipe up to the marker (printed by gnuplot after unset output)
+   data = bytearray()
+   while not data.endswith(marker):
+      chunk = os.read(fd, 2**16)
+      if not chunk:   # gnuplot died
+         break
+      data += chunk
+   out.append(bytes(data[:-len(marker)] if data.endswith(marker) else data))
+
+def _iserror(msg):
+   # gnuplot reports errors with the line, e.g. "line 0: invalid command"
+   return re.search(r'line \d+: (?!warning)', msg) is not None
+
+_lodplots = weakref.WeakSet()   # instances waiting for a new x-range from gnuplot
+_lodprev = None   # the former SIGUSR1 handler; chained, and restored when no instance waits
+
+def _lodsignal(signum, frame):
+   for gp in list(_lodplots):
+      gp._lodpoll()
+   if callable(_lodprev):
+      _lodprev(signum, frame)
+
+def _lodrestore():
+   global _lodprev
+   if not _lodplots and signal.getsignal(signal.SIGUSR1) is _lodsignal:
+      try:
+         signal.signal(signal.SIGUSR1, _lodprev if _lodprev is not None else signal.SIG_DFL)
+      except ValueError:
+         return   # not in the main thread
+      _lodprev = None
+
+def _bincols(data, alloc=lambda shape: np.empty(shape, dtype='<f8')):
+   # stack the columns into rows of little-endian doubles (as zip, truncate to the shortest)
+   # alloc provides the array to be filled, e.g. a memmap
+   cols = [np.asarray(col) for col in data]
+   if any(col.dtype.kind not in 'biuf' for col in cols):
+      raise ValueError('strings cannot be passed as doubles')
+   n = min(len(col) for col in cols)
+   arr = alloc((n, len(cols)))
+   for j, col in enumerate(cols):
+      arr[:,j] = col[:n]
+   return arr
+
+def _binchunks(data, chunk=2**16):
+   # as _bincols, but in windows of rows (bounded memory for large or memory-mapped columns)
+   cols = [np.asarray(col) for col in data]
+   if any(col.dtype.kind not in 'biuf' for col in cols):
+      raise ValueError('strings cannot be passed as doubles')
+   n = min(len(col) for col in cols)
+   for i in range(0, n, chunk):
+      yield _bincols([col[i:min(i+chunk, n)] for col in cols])
+
+_bintypes = {'f4': 'float32', 'f8': 'float64', 'i1': 'int8', 'u1': 'uint8', 'i2': 'int16', 'u2': 'uint16',
+             'i4': 'int32', 'u4': 'uint32', 'i8': 'int64', 'u8': 'uint64'}
+
+def _binref(parts, fields=None):
+   # a memmap as its file with a binary spec, so that gnuplot reads the data in place (no copy);
+   # 1D, records (structured), or 2D with interleaved columns (e.g. the transpose of a row-major file)
+   # returns the reference; None, if not applicable
+   arr = parts[0] if len(parts) == 1 else None
+   if not isinstance(arr, np.memmap) or getattr(arr, '_mmap', None) is None or not arr.filename or arr.mode == 'c' or not arr.size:
+      return None
+   size = arr.dtype.itemsize
+   if arr.dtype.names:
+      if arr.ndim != 1 or arr.strides[0] != size:
+         return None
+      names = arr.dtype.names
+      fields = names if fields is None else [names[f] if isinstance(f, numbers.Integral) else f for f in fields]
+      items = sorted((arr.dtype.fields[name][1], name, arr.dtype.fields[name][0]) for name in names)
+      if [name for off, name, dt in items if name in fields] != list(fields):
+         return None   # gnuplot gets the columns in the file order
+      types, pos = [], 0
+      for off, name, dt in items:
+         if off != pos or dt.subdtype:
+            return None   # padding, subarrays
+         types.append((dt, '%' if name in fields else '%*'))
+         pos += dt.itemsize
+      if pos != size:
+         return None
+      n = len(arr)
+   elif arr.ndim == 1 and arr.strides == (size,):
+      types, n = [(arr.dtype, '%')], len(arr)
+   elif arr.ndim == 2 and arr.strides == (size, size*arr.shape[0]):
+      types, n = [(arr.dtype, '%')] * arr.shape[0], arr.shape[1]
+   else:
+      return None
+   if any(dt.kind+str(dt.itemsize) not in _bintypes for dt, c in types):
+      return None
+   orders = set({'=': sys.byteorder[0], '<': 'l', '>': 'b'}.get(dt.byteorder) for dt, c in types) - set([None])
+   if len(orders) > 1:
+      return None
+   if arr.mode != 'r':
+      arr.flush()
+   # position in the file: the mapping starts at the allocation granularity below the offset
+   start = arr.offset - arr.offset % mmap.ALLOCATIONGRANULARITY
+   skip = start + arr.ctypes.data - np.frombuffer(arr._mmap, np.uint8).ctypes.data
+   fmt = ''.join(c + _bintypes[dt.kind+str(dt.itemsize)] for dt, c in types)
+   endian = {'l': 'little', 'b': 'big'}.get(orders.pop() if orders else None, 'default')
+   return '"%s" binary record=%d skip=%d format="%s" endian=%s ' % (arr.filename, n, skip, fmt, endian)
+
+def _binmatrix(parts, opt):
+   # a 2D array (optionally after the x and y axis) for "matrix" as raw data; x is the first index
+   # returns the array, the binary spec, and the remaining options; None, if not applicable
+   m = re.match(r'\s*(nonuniform\s+)?matrix\b', opt)
+   if not m or re.search(r'\bus(i(n(g)?)?)?\b', opt[m.end():].split(',')[0]):
+      return None   # using refers to the columns of the text matrix
+   parts = [np.asarray(part) for part in parts]
+   if any(part.dtype.kind not in 'biuf' for part in parts):
+      return None
+   if len(parts) == 1 and parts[0].ndim == 2:
+      x = y = None
+      z = parts[0]
+   elif len(parts) == 3 and parts[0].ndim == parts[1].ndim == 1 and parts[2].shape == (len(parts[0]), len(parts[1])):
+      x, y, z = parts
+   else:
+      return None
+   if x is None and not m.group(1):
+      # uniform, pixel coordinates as in the text matrix
+      return np.ascontiguousarray(z.T, dtype='<f8'), ' binary array=(%d,%d) format="%%float64" endian=little ' % z.shape, opt[m.end():]
+   if x is None:
+      arr = z.T   # with the axes as in the text (first row: n, x; first column: y)
+   else:
+      arr = np.empty((len(y)+1, len(x)+1))
+      arr[0,0] = len(x)
+      arr[0,1:] = x
+      arr[1:,0] = y
+      arr[1:,1:] = z.T
+   # binary matrix is always nonuniform (native float32)
+   return np.ascontiguousarray(arr, dtype=np.float32), ' binary matrix ', opt[m.end():]
+
+_shmdir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+class _classlazy(object):
+   # a class attribute computed on first access (e.g. probing gnuplot), then cached in the class
+   def __init__(self, func):
+      self.func = func
+      self.__doc__ = func.__doc__
+
+   def __get__(self, obj, cls):
+      value = self.func(cls)
+      for owner in cls.__mro__:
+         if self.func.__name__ in owner.__dict__:
+            setattr(owner, self.func.__name__, value)
+            break
+      return value
+
+class _Default(object):
+   # the default instance; gnuplot is started on first use
+   def __init__(self, cls):
+      object.__setattr__(self, '_cls', cls)
+      object.__setattr__(self, '_obj', None)
+
+   def _get(self):
+      if self._obj is None:
+         object.__setattr__(self, '_obj', self._cls())
+      return self._obj
+
+   def __getattr__(self, name):
+      return getattr(self._get(), name)
+
+   def __setattr__(self, name, value):
+      setattr(self._get(), name, value)
+
+   def __call__(self, *args, **kwargs):
+      return self._get()(*args, **kwargs)
+
+   # operators are looked up on the type, not via __getattr__
+   def __add__(self, other):
+      return self._get() + other
+
+   def __sub__(self, other):
+      return self._get() - other
+
+   def __lt__(self, other):
+      return self._get() < other
+
+   def __repr__(self):
+      return '<default %s (%s)>' % (self._cls.__name__, 'not started' if self._obj is None else 'started')
+
+
+def _textchunks(data, fmt='%s', chunk=2**16):
+   # format the columns row-wise in bulk, i.e. one string formatting per chunk of rows;
+   # numeric columns use fmt, the others (strings, dates) are converted with str
+   cols = [np.asarray(col) for col in data]
+   cols = [col if col.dtype.kind in 'biuf' else col.astype(str) for col in cols]
+   n = min(len(col) for col in cols)
+   row = " ".join(fmt if col.dtype.kind in 'biuf' else '%s' for col in cols) + "\n"
+   for i in range(0, n, chunk):
+      m = min(chunk, n-i)
+      obj = np.empty((m, len(cols)), dtype=object)
+      for j, col in enumerate(cols):
+         obj[:,j] = col[i:i+m]
+      yield row*m % tuple(obj.ravel())
+
+def _totext(data, fmt='%s'):
+   return ''.join(_textchunks(data, fmt))
+
+class _Chunks(object):
+   # text accumulated in linear time (a list of strings) for deferred plots (flush='');
+   # beyond limit characters it spills to a temporary file; written with one vectored write
+   limit = 2**26
+
+   def __init__(self, s=''):
+      self.parts = []
+      self.size = 0
+      self.file = None
+      self.__iadd__(s)
+
+   def __len__(self):
+      return self.size
+
+   def __str__(self):
+      if self.file:
+         self.file.seek(0)
+         return self.file.read()
+      return ''.join(self.parts)
+
+   def __iadd__(self, s):
+      if isinstance(s, _Chunks):
+         if s.file:
+            self._spill()
+            s.file.seek(0)
+            shutil.copyfileobj(s.file, self.file)
+            self.size += s.size
+         else:
+            for part in s.parts:
+               self.__iadd__(part)
+      elif s:
+         self.size += len(s)
+         if self.file:
+            self.file.write(s)
+         else:
+            self.parts.append(s)
+            if self.size > self.limit:
+               self._spill()
+      return self
+
+   def _spill(self):
+      if not self.file:
+         self.file = tempfile.TemporaryFile('w+', prefix='gplot_')
+         self.file.writelines(self.parts)
+         self.parts = []
+
+   def writeto(self, f):
+      # os.writev of the parts (sendfile of the spilled file; Linux only, since elsewhere
+      # the target must be a socket) to the descriptor of the stream f
+      try:
+         fd = f.fileno() if hasattr(os, 'writev') else None
+      except (AttributeError, IOError, ValueError):
+         fd = None
+      if self.file and fd is not None and sys.platform.startswith('linux'):
+         f.flush()
+         self.file.flush()
+         offset, end = 0, os.fstat(self.file.fileno()).st_size
+         try:
+            while offset < end:
+               offset += os.sendfile(fd, self.file.fileno(), offset, end-offset)
+            return
+         except OSError:
+            if offset:
+               raise
+      if fd is None or self.file:
+         if self.file:
+            self.file.seek(0)
+            shutil.copyfileobj(self.file, f)
+         else:
+            f.writelines(self.parts)
+         return
+      f.flush()
+      enc = getattr(f, 'encoding', None) or 'utf-8'
+      data = [part if isinstance(part, bytes) else part.encode(enc) for part in self.parts]
+      i = 0
+      while i < len(data):
+         n = os.writev(fd, data[i:i+1024])   # IOV_MAX
+         while i < len(data) and n >= len(data[i]):
+            n -= len(data[i])
+            i += 1
+         if n:
+            data[i] = data[i][n:]
+
+def _gpconst(value, quote=False):
+   # a python or numpy scalar as gnuplot constant in full precision;
+   # strings are passed as they are (expressions) or quoted
+   if isinstance(value, (str, u''.__class__)):
+      return "'%s'" % value.replace("'", "''") if quote else value
+   if isinstance(value, numbers.Integral):
+      return str(int(value))
+   if isinstance(value, numbers.Real):
+      value = float(value)
+      if value != value:
+         return 'NaN'
+      if abs(value) == float('inf'):
+         return '(%s1e308*10)' % ('-' if value < 0 else '')
+      return repr(value)
+   if isinstance(value, numbers.Complex):
+      return '{%s,%s}' % (_gpconst(value.real), _gpconst(value.imag))
+   return str(value)
 
 
 class Gplot(object):
@@ -30,14 +428,63 @@ class Gplot(object):
        * '' - create a local persistent file
        * '-' - use gnuplot special filename (no interactive zoom available,
                replot does not work)
+       * 'binary' - create a non-persistent temporary file with raw little-endian
+               doubles (no text conversion; numeric data only, otherwise as None)
+       * 'shm' - as 'binary', but memory-mapped in /dev/shm (no disk I/O)
        * 'filename' - create manually a temporary file
+       The temporary files (None, 'binary', 'shm') are reused for the same curve in the
+       next plots, once gnuplot has confirmed the plot that read them (without queue);
+       until then, a new file is written. Files of curves, which the new plot does not
+       have, are closed after the confirmation.
+       Out-of-core data: a numpy.memmap (1D, records, or 2D with interleaved columns, e.g.
+       the transpose of a row-major file) is read by gnuplot directly from its file with a
+       binary spec (except for '', '-', 'filename' and lod). Other large data is written in
+       chunks of rows (large '$' datablocks are streamed ahead), so that memory stays bounded;
+       '-' and 'shm' need the complete data in memory.
+   tmpmax : int, optional
+       Maximum number of temporary files (default 512). See also tmpusage() and close().
+   fmt : str, optional
+       Format for numeric data in text transports. The default '%s' formats as str.
+       A shorter format, e.g. '%.7g', reduces the payload. Strings are passed as they are.
+   cache : int, optional
+       Byte budget for data kept in gnuplot (tmp='$', None, 'binary', 'shm'). Data passed
+       again, e.g. in replot or oplot, is then referenced by name instead of being sent
+       again. Beyond the budget, the least recently used data is discarded (datablocks
+       are undefined). Default is 0 (no cache).
+   lod : int or boolean, optional
+       Level of detail. Curves with more points are reduced to the min/max envelope in lod
+       bins (lod=True: 2000, about the pixel width of a terminal) before sending. 1D data
+       gets then the index as explicit x column. x is assumed to be sorted. The calls are
+       recorded and can be plotted again for a range with refine(xmin, xmax), decimated to
+       lod bins within the range (at full resolution, once it has less than 2*lod points).
+       This is done automatically with the key bindings of zoom.gnu (via SIGUSR1).
    stdout : boolean, optional
        If true, plot commands are send to stdout instead to gnuplot pipe.
    stderr : int, optional
        Gnuplot prints errors and user prints to stderr (term output is sent to stdout). The
-       default stderr=None retains this behaviour. stderr=-1 (subprocess.PIPE) tries to
-       capture stderr so that the output can be redirected to the Jupyter cells instead of
-       parent console. This feature can be fragile and is experimental.
+       default stderr=None retains this behaviour. stderr=-1 (subprocess.PIPE) captures
+       stderr so that the output can be redirected to the Jupyter cells instead of parent
+       console. After each command, gnuplot prints a marker and the messages up to it are
+       printed; errors raise GnuplotError. Commands waiting for input (pause) block.
+   queue : str, optional
+       Asynchronous mode. Commands and plots are put onto a queue which is written by a
+       background thread, so the caller does not wait for gnuplot to read the data.
+       When the queue is full:
+       * 'block' - wait for space
+       * 'drop' - discard the oldest queued plot (with the curves added to it)
+       * 'coalesce' - a new plot replaces all queued plots; wait for space otherwise
+       Settings are never discarded. Use wait() or await done() as barrier.
+   qsize : int, optional
+       Maximum number of queued items (default 16).
+   server : str, optional
+       Path of the Unix socket of a Gserver. A session of the server is used instead of
+       starting gnuplot (a connect instead of a process spawn). cmdargs is then ignored.
+   stats : boolean, callable, or 'log', optional
+       Record each call (put, plot, ...) in the dict stats: totals of calls, bytes
+       (sent to the pipe), format (time for formatting/storing the data), write (time
+       blocked in put), done (time until gnuplot confirmed the call; with stderr only),
+       and the last record. A callable gets each record; 'log' logs them to the logger
+       'gplot' (debug level). Default is False (no overhead).
    mode : str, optional
        Primary command for the call method. The default is 'plot'. After creation it can
        be changed, e.g. gplot.mode = gplot.splot.
@@ -45,11 +492,17 @@ class Gplot(object):
    args : array or str for function, file, or other plot commands like style
    flush : str, optional
        set to '' to suppress flush until next the ogplot (for large data sets)
+   fields : list, optional
+       Columns (names or positions) of structured arrays, record arrays, and pandas
+       DataFrames in the call (default: all). The columns are taken as views, without copy.
 
    Methods
    -------
    __call__
+   batch
+   close
    load
+   refine
    replot
    plot
    print
@@ -57,13 +510,23 @@ class Gplot(object):
    set
    splot
    test
+   tmpusage
    unset
    var
+   wait
 
    NOTES
    -----
    The attribute print does not work in python 2.
 
+   A 2D array followed by "matrix" (x is the first index) is passed as binary file
+   (binary array=(nx,ny); with tmp='$', None, 'binary', 'shm'). With the axes x and y
+   before it, or with "nonuniform matrix", as binary matrix (float32). With using, it is
+   passed as text matrix (the columns of using differ for binary arrays).
+
+   >>> gplot(np.random.rand(300, 200), 'matrix w image')
+   >>> gplot(x, y, z, 'nonuniform matrix w image')
+
    Examples
    --------
 
@@ -88,118 +551,619 @@ class Gplot(object):
 
    >>> gplot.key_bottom_rev("left")('sin(x)')
    """
-   version = subprocess.check_output(['gnuplot', '-V'])
-   version = float(version.split()[1])
+   _bulk = 1000   # arrays with more elements are sent as datablock
+   _reuse = True   # temporary files are reused for the same curve in the next plot
 
-   def __init__(self, cmdargs='', tmp='$', mode='plot', stdout=False, stderr=None):
+   @_classlazy
+   def version(cls):
+      return float(subprocess.check_output(['gnuplot', '-V']).split()[1])
+
+   def __init__(self, cmdargs='', tmp='$', mode='plot', stdout=False, stderr=None, fmt='%s', cache=0, lod=0, queue=None, qsize=16, stats=False, tmpmax=512, server=None):
       self.stdout = stdout
       self.tmp = tmp
+      self.tmpmax = tmpmax
+      self.fmt = fmt
+      self.cachesize = cache
+      self.cache = OrderedDict()   # content hash -> (reference, name, size, tmpfile)
+      self._inuse = set()
+      self.lod = lod
+      self._lodcalls = []    # calls of the current plot, to be repeated by refine
+      self._lodrange = None
+      self._lodnext = False   # x-range requested by gnuplot, but not yet plotted
+      self._lodfile = None
+      self._busy = False
+      self._newkeys = []   # cache entries created in the current call
+      self.queue = queue
+      if queue:
+         self._queue = deque()   # items: [text, kind, cache keys]
+         self._qsize = qsize
+         self._pending = 0       # queued and in writing
+         self._error = None
+         self._cond = threading.Condition()
+         self._thread = threading.Thread(target=self._writer)
+         self._thread.daemon = True
+         self._thread.start()
       self.mode = getattr(self, mode)   # set the default mode for __call__ (plot, splot)
-      self.gnuplot = subprocess.Popen('gnuplot '+cmdargs, shell=True, stdin=subprocess.PIPE,
-                   stderr=stderr, universal_newlines=True, bufsize=0)   # This line is needed for python3! Unbuffered and to pass str instead of bytes
-      self.pid = self.gnuplot.pid
+      if server:
+         self.gnuplot = _Session(server, stderr)
+         self.version = self.gnuplot.version   # no probe
+      else:
+         self.gnuplot = self._popen(cmdargs, stderr)
+      self.pid = self.gnuplot.pid if self.gnuplot else os.getpid()
       self.og = 0   # overplot number
-      self.buf = ''
-      self.tmp2 = []
+      self.buf = _Chunks()
+      self._pool = {}   # (shm, curve number) -> (plot number, temporary file)
+      self._retired = []   # (plot number, temporary file), closed when gnuplot has confirmed the plot
+      self._gen = 0    # plot number (calls of _plot)
+      self._done = 0   # plot number confirmed by gnuplot
+      self._ackfile = None   # gnuplot writes the confirmed plot number to it (without stderr)
+      if queue:
+         self._reuse = False   # the queued plots may still refer to the files
+      self.tmp2 = []    # temporary files, which are not reused
       self.flush = None
       self.put = self._put
-      if stderr:
-          import fcntl
-          fcntl.fcntl(self.gnuplot.stderr, fcntl.F_SETFL, os.O_NONBLOCK)
+      self._markers = itertools.count()
+      self._batch = None   # collected commands (batch mode)
+      self._batchsize = None
+      self._batchlen = 0
+      if stderr and self.gnuplot:
           self.put = self.PUT
+      self._rec = None   # record of the current call (stats)
+      self._stats = stats
+      self.stats = {'calls': 0, 'bytes': 0, 'format': 0., 'write': 0., 'done': 0., 'last': None}
+      if stats:
+         self.put = self._instrument(self.put)
+         for name in ('plot', 'splot', 'replot', 'oplot', 'test'):
+            setattr(self, name, self._instrument(getattr(self, name), name))
+         self.mode = getattr(self, mode)
+
+   def _popen(self, cmdargs, stderr, **kwargs):
+      return subprocess.Popen('gnuplot '+cmdargs, shell=True, stdin=subprocess.PIPE,
+                   stderr=stderr, universal_newlines=True, bufsize=0, **kwargs)   # This line is needed for python3! Unbuffered and to pass str instead of bytes
 
    def _plot(self, *args, **kwargs):
       # collect all arguments
       tmp = kwargs.pop('tmp', self.tmp)
+      fmt = kwargs.pop('fmt', self.fmt)
       flush = kwargs.pop('flush', '\n')
+      lod = kwargs.pop('lod', self.lod)
+      lodrange = kwargs.pop('lodrange', None)
+      fields = kwargs.pop('fields', None)
+      if lod:
+         if args[:1] in (('plot ',), ('splot ',)):
+            self._lodcalls = []
+            self._lodrange = lodrange   # a new plot starts with the full range
+         self._lodcalls.append((args, dict(kwargs, tmp=tmp, fmt=fmt, flush=flush, lod=lod, fields=fields)))
+         self._lodhook()
+         if lod is True:
+            lod = 2000
+         if args[:1] == ('splot ',):
+            lod = 0
       if self.version in [4.6] and flush=="\n": flush = "\n\n"   # append a newline to workaround a gnuplot pipe bug
       # with mouse zooming (see http://sourceforge.net/p/gnuplot/bugs/1203/)
+      self._gen += 1
+      self._acked()
+      if self.flush != '' and args[:1] in (('plot ',), ('splot ',)):
+          self._inuse = set()   # a new plot; cached data of the previous one may be evicted
       self.flush = flush
       pl = ''
       buf = ''
       data = ()
-      if tmp in ('$',):
-           pl, self.buf = self.buf, pl
-
-      for arg in args + (flush,):
-         if isinstance(arg, (str, u''.__class__)):   # append argument, but flush the data before
-            if data:
-               # transpose data when writing
-               data = zip(*data)
-               self.og += 1
-               tmpname = tmp
-               if tmp in ('-',):
-                  # use gnuplot's special filename '-'
-                  self.buf += "\n".join(" ".join(map(str,tup)) for tup in data)+"\ne\n"
-               elif tmp in ('$',):
-                  # gnuplot's inline datablock
-                  tmpname = "$data%s" % self.og
-                  # prepend the datablock
-                  buf += tmpname+" <<EOD\n"+("\n".join(" ".join(map(str,tup)) for tup in data))+"\nEOD\n"
-               elif tmp is None:
-                  # create temporary file; default
-                  self.tmp2.append(tempfile.NamedTemporaryFile())
-                  tmpname = self.tmp2[-1].name
-                  #savetxt(tmp2[-1], data) #zipped data not supported by python3
-                  savetxt(self.tmp2[-1], list(data), fmt="%s") # zipped data not supported by python3, fmt="%s" to allow for strings
-                  self.tmp2[-1].seek(0)
-               else:
-                  # create local temporary file
-                  if tmp == '':
-                     tmpname = 'gptmp_'+str(self.pid)+str(self.og)
-                  savetxt(tmpname, list(data), fmt="%s")
-               pl += '"'+tmpname+'"'
-            pl += arg
-            data = ()
+      parts = []   # the arguments of data
+
+      self._busy = True
+      try:
+         self._newkeys = []
+         for arg in args + (flush,):
+            if isinstance(arg, (str, u''.__class__)):   # append argument, but flush the data before
+               if data:
+                  self.og += 1
+                  if self._rec is not None: t = time.time()
+                  raw = ref = None
+                  if tmp in ('$', None, 'binary', 'shm'):
+                     raw = _binmatrix(parts, arg)
+                     if not raw and not lod:
+                        ref = _binref(parts, fields)
+                  if raw:
+                     # 2D array with matrix, as binary
+                     arr, spec, arg = raw
+                     ref, block = self._store(tuple(parts), tmp, fmt, (arr, spec))
+                  elif ref:
+                     block = ''   # gnuplot reads the file of the memmap
+                  else:
+                     if lod:
+                        data = _decimate(data, lod, self._lodrange)
+                     ref, block = self._store(data, tmp, fmt)
+                  if self._rec is not None: self._rec['format'] += time.time() - t
+                  buf += block
+                  pl += ref
+               pl += arg
+               data = ()
+               parts = []
+            else:
+               parts.append(arg)
+               data += _argcols(arg, fields)
+
+         # for the queue: complete plots and the curves added to them can be dropped
+         kind = 'cmd'
+         if flush != '' and args[:1] in (('plot ',), ('splot ',)):
+             kind = 'plot'
+         elif flush != '' and args[:1] in (('replot ',), (' replot ',)):
+             kind = 'oplot'
+         if self.queue and kind != 'cmd' and buf:
+             # the datablocks (and undefines) go ahead, they stay when the plot is dropped,
+             # as later plots may refer to them via the cache
+             self.put(buf, end='', keys=self._newkeys)
+             buf, self._newkeys = '', []
+         if tmp in ('$',):
+             self.buf += pl   # the command waits for the flush, the datablocks are sent now
+             pl = ''
+         pl = _Chunks(buf + pl)
+         if flush != '':
+             pl += self.buf
+             self.buf = _Chunks()
+         self.put(pl, end='', kind=kind, keys=self._newkeys)
+         if flush != '' and (self._pool or self._retired) and self._done < self._gen:
+            self._ack()   # not confirmed via stderr
+      finally:
+         self._busy = False
+      if kind == 'plot':
+         self._release()
+      self._lodcheck()
+
+   def _release(self):
+      # retire the temporary files of curves, which the current plot does not have
+      for slot in list(self._pool):
+         if slot[1] > self.og:
+            self._retired.append(self._pool.pop(slot))
+
+   def _ack(self):
+      # without stderr, gnuplot confirms the plots by writing the number to a file (read by _acked)
+      if self.gnuplot and not self.stdout:
+         if not self._ackfile:
+            self._ackfile = tempfile.NamedTemporaryFile(prefix='gplot_')
+         self._put('system \'echo %d > "%s"\'' % (self._gen, self._ackfile.name))
+
+   def _acked(self, gen=None):
+      # gnuplot has read the plots up to gen; close the files retired by them
+      if gen is None and self._ackfile:
+         with open(self._ackfile.name) as f:
+            gen = f.read().strip()
+         gen = int(gen) if gen.isdigit() else None
+      if gen is not None:
+         self._done = max(self._done, gen)
+      for entry in [entry for entry in self._retired if entry[0] <= self._done]:
+         self._retired.remove(entry)
+         entry[1].close()
+
+   def tmpusage(self):
+      '''Number and size of the temporary files (reused and cached ones), and the size of
+      the deferred plot (characters accumulated with flush='', spilled to a file beyond 64M).'''
+      files = [entry[1] for entry in list(self._pool.values()) + self._retired] + self.tmp2 + \
+              [entry[3] for entry in self.cache.values() if entry[3]]
+      return {'files': len(files), 'bytes': sum(os.fstat(f.fileno()).st_size for f in files), 'limit': self.tmpmax,
+              'deferred': len(self.buf)}
+
+   def close(self):
+      '''Terminate gnuplot and close the temporary files.'''
+      if self.queue:
+         self.wait()
+         with self._cond:
+            self._queue.append(None)   # stop the writer
+            self._cond.notify_all()
+         self._thread.join()
+      if self.gnuplot and not self.gnuplot.stdin.closed:
+         self.gnuplot.stdin.close()
+         self.gnuplot.wait()
+      for tmpfile in [entry[1] for entry in list(self._pool.values()) + self._retired] + self.tmp2 + \
+                     [entry[3] for entry in self.cache.values()] + [self._ackfile]:
+         if tmpfile:
+            tmpfile.close()
+      self._pool.clear()
+      del self._retired[:]
+      self._ackfile = None
+      self.cache.clear()
+      del self.tmp2[:]
+      if self._lodfile:
+         _lodplots.discard(self)
+         _lodrestore()
+         self._lodfile.close()
+         self._lodfile = None
+
+   def __enter__(self):
+      return self
+
+   def __exit__(self, *args):
+      self.close()
+
+   def _lodhook(self):
+      # let the zoom.gnu bindings report the new x-range (via file and SIGUSR1)
+      global _lodprev
+      if self._lodfile or not hasattr(signal, 'SIGUSR1'):
+         return
+      prev = signal.getsignal(signal.SIGUSR1)
+      if prev is not _lodsignal:
+         try:
+            signal.signal(signal.SIGUSR1, _lodsignal)
+         except ValueError:
+            return   # not in the main thread
+         _lodprev = prev
+      self._lodfile = tempfile.NamedTemporaryFile()
+      _lodplots.add(self)
+      self.put("GPLOT_LOD = 'set print \"%s\"; print GPVAL_X_MIN, GPVAL_X_MAX, GPVAL_DATA_X_MIN, GPVAL_DATA_X_MAX; unset print; system(\"kill -USR1 %s\")'" % (self._lodfile.name, os.getpid()))
+      self.put("REPLOT = 'replot; eval GPLOT_LOD'")
+
+   def _lodpoll(self):
+      # read the x-range printed by gnuplot
+      with open(self._lodfile.name) as f:
+         xr = f.read().split()
+      if len(xr) < 4:
+         return
+      open(self._lodfile.name, 'w').close()
+      xmin, xmax, dmin, dmax = map(float, xr)
+      # when the view covers all the data sent, (auto)scale to the full data
+      self._lodnext = None if xmin <= dmin and dmax <= xmax else (xmin, xmax)
+      self._lodcheck()
+
+   def _lodcheck(self):
+      # do not interfere with a plot in progress or in accumulation (flush='')
+      if self._lodnext is not False and not self._busy and self.flush != '':
+         xrange, self._lodnext = self._lodnext, False
+         if xrange != self._lodrange:
+            self.refine(*xrange or ())
+
+   def refine(self, xmin=None, xmax=None):
+      '''Plot again the calls recorded with lod for the range [xmin:xmax].
+
+      Only the points in the range are decimated to lod bins, i.e. the detail increases
+      with the zoom; ranges with less than 2*lod points are plotted at full resolution.
+      Without range, the full data is decimated again.
+      '''
+      xrange = None if xmin is None else (xmin, xmax)
+      calls, self._lodcalls = self._lodcalls, []
+      for args, kwargs in calls:
+         if args[:1] in (('plot ',), ('splot ',)):
+            self.og = 0; self.buf = _Chunks(); self.put('\n')        # reset
+         self._plot(*args, lodrange=xrange, **kwargs)
+      return self
+
+   def _store(self, data, tmp, fmt, raw=None):
+      # pass the data in the way requested by tmp
+      # raw: array and binary spec to be passed instead of data (matrix)
+      # returns the reference for the plot command and the text to be sent before it
+      key = None
+      if raw and tmp == '$':
+         tmp = None   # a datablock cannot hold binary data
+      if self.cachesize and tmp in ('$', None, 'binary', 'shm'):
+         key = _datakey(data, tmp, raw[1] if raw else fmt)
+         if key in self.cache:
+            self.cache[key] = self.cache.pop(key)   # most recently used
+            self._inuse.add(key)
+            return self.cache[key][0], ''
+      tmpname = tmp
+      spec = block = ''
+      tmpfile = arr = shape = None
+      if tmp in (None, 'binary', 'shm'):
+         # reuse the file (and its pages) of the curve, unless it is kept in the cache or
+         # gnuplot may still read it (the plot is not confirmed)
+         slot = tmp == 'shm', self.og
+         tmpfile = None
+         if self._reuse and not key and slot in self._pool:
+            gen, tmpfile = self._pool.pop(slot)
+            if gen > self._done:
+               self._retired.append((gen, tmpfile))
+               tmpfile = None
+         if tmpfile:
+            tmpfile.seek(0)
+            tmpfile.truncate()
          else:
-            # collect data; append columns and matrices
-            _1D = hasattr(arg, '__iter__')
-            _2D = _1D and hasattr(arg[0], '__iter__') and not isinstance(arg[0], str)
-            data += tuple(arg) if _2D else (arg,) if _1D else ([arg],)
-
-      if tmp in ('$',):
-          self.put(buf, end='')
-          self.buf += pl
-          pl = ''
-      self.put(pl, end='')
-      if flush != '':
-          self.put(self.buf, end='')
-          self.buf = ''
+            if self.tmpusage()['files'] >= self.tmpmax:
+               raise ValueError('too many temporary files (tmpmax=%d)' % self.tmpmax)
+            tmpfile = tempfile.NamedTemporaryFile(dir=_shmdir if tmp == 'shm' else None, prefix='gplot_')
+            if key:
+               pass   # the cache owns it
+            elif not self._reuse:
+               self.tmp2.append(tmpfile)
+         if self._reuse and not key:
+            self._pool[slot] = self._gen, tmpfile
+         tmpname = tmpfile.name
+      if tmp == 'shm':
+         def alloc(shape):
+            tmpfile.truncate(8*shape[0]*shape[1])
+            if not shape[0]:
+               return np.empty(shape)   # an empty file cannot be mapped
+            return np.memmap(tmpname, dtype='<f8', mode='r+', shape=shape)
+         try:
+            arr = None if raw else _bincols(data, alloc)
+            shape = arr.shape if arr is not None else None
+            del arr   # unmap
+         except ValueError:
+            tmpfile.seek(0)
+            tmpfile.truncate()
+      if tmp == 'binary' and not raw:
+         try:
+            # in windows of rows, the complete array is never in memory
+            n = k = 0
+            for arr in _binchunks(data):
+               arr.tofile(tmpfile)
+               n, k = n + len(arr), arr.shape[1]
+            shape = n, k or len(data)
+         except ValueError:
+            pass   # strings cannot be passed as doubles
+      if raw:
+         arr, spec = raw
+         arr.tofile(tmpfile)
+      elif shape is not None:
+         # raw doubles, gnuplot reads them without parsing
+         spec = ' binary record=%d format="%s" endian=little ' % (shape[0], '%float64'*shape[1])
+      elif tmpfile:
+         for txt in _textchunks(data, fmt):
+            tmpfile.write(txt.encode())
+      elif tmp in ('-',):
+         # use gnuplot's special filename '-'
+         for txt in _textchunks(data, fmt):
+            self.buf += txt
+         self.buf += "e\n"
+      elif tmp in ('$',):
+         # gnuplot's inline datablock; cached ones are named by their content
+         tmpname = "$gp_%s" % key[:16] if key else "$data%s" % self.og
+         if key or min(len(col) for col in data) <= 2**16:
+            # prepend the datablock
+            block = tmpname+" <<EOD\n" + _totext(data, fmt) + "EOD\n"
+         else:
+            # large data is streamed ahead in chunks, the complete text is never in memory
+            self._put(tmpname+" <<EOD")
+            for txt in _textchunks(data, fmt):
+               self._put(txt, end='')
+            self._put("EOD")
+      else:
+         # create local temporary file
+         if tmp == '':
+            tmpname = 'gptmp_'+str(self.pid)+str(self.og)
+         with open(tmpname, 'w') as f:
+            f.writelines(_textchunks(data, fmt))
+      if tmpfile:
+         tmpfile.flush()
+      ref = '"'+tmpname+'"' + spec
+      if key:
+         size = len(block) if tmp == '$' else os.path.getsize(tmpname)
+         self.cache[key] = (ref, tmpname, size, tmpfile)
+         self._inuse.add(key)
+         self._newkeys.append(key)
+         block = self._evict() + block
+      return ref, block
+
+   def _evict(self):
+      # discard least recently used data beyond the cache budget, except for the current plot
+      cmds = ''
+      total = sum(entry[2] for entry in self.cache.values())
+      for key in list(self.cache):
+         if total <= self.cachesize:
+            break
+         if key not in self._inuse:
+            ref, tmpname, size, tmpfile = self.cache.pop(key)
+            total -= size
+            if tmpfile:
+               self._retired.append((self._gen, tmpfile))   # a previous plot may still read it
+            else:
+               cmds += "undefine %s\n" % tmpname
+      return cmds
 
    def _put(self, *args, **kwargs):
       # send the commands to gnuplot
-      print(file=None if self.stdout else self.gnuplot.stdin, *args, **kwargs)
+      kind = kwargs.pop('kind', 'cmd')
+      keys = kwargs.pop('keys', ())
+      sep, end = kwargs.get('sep'), kwargs.get('end')
+      if len(args) == 1 and isinstance(args[0], _Chunks):
+         s = args[0]   # deferred plot, written at once
+         s += '\n' if end is None else end
+      else:
+         s = (' ' if sep is None else sep).join(map(str, args)) + ('\n' if end is None else end)
+      if self._rec is None:
+         self._send(s, kind, keys)
+      else:
+         t = time.time()
+         self._send(s, kind, keys)
+         self._rec['write'] += time.time() - t
+         self._rec['bytes'] += len(s)
       return self
 
-   def PUT(self, *args, **kwargs):
-      # same a _put, but tries to catch stdout and stderr of gnuplot
-      #r,w = os.pipe()
-      #stdout = '/proc/%s/fd/%s' % (os.getpid(), w)
-      #f = os.fdopen(r, 'r')
-      #g = os.fdopen(w, 'w')
-      #self.gnuplot.stdin.write("set print '%s'\n"% stdout)
-      self._put(*args, **kwargs)
-      self.gnuplot.stdin.write('printerr ""\n')
-      # self.gnuplot.stdin.write("set print\n")
-      # g.close()
-      # s = f.read()
-      # f.close()
-      import time
+   def _instrument(self, func, name=None):
+      # wrap put and the plot methods to record each call (stats)
+      def call(*args, **kwargs):
+         if self._rec is not None:   # nested
+            return func(*args, **kwargs)
+         cmd = name or (str(args[0]).split() or [''])[0]
+         self._rec = {'cmd': cmd, 'bytes': 0, 'format': 0., 'write': 0., 'done': None, 'total': 0., 'start': time.time()}
+         try:
+            return func(*args, **kwargs)
+         finally:
+            rec, self._rec = self._rec, None
+            rec['total'] = time.time() - rec['start']
+            self._report(rec)
+      return call
+
+   def _report(self, rec):
+      stats = self.stats
+      stats['calls'] += 1
+      for name in ('bytes', 'format', 'write'):
+         stats[name] += rec[name]
+      stats['done'] += rec['done'] or 0
+      stats['last'] = rec
+      if self._stats == 'log':
+         import logging
+         logging.getLogger('gplot').debug('%(cmd)s: %(bytes)d bytes, format %(format).6f s, write %(write).6f s, done %(done)s s, total %(total).6f s', rec)
+      elif callable(self._stats):
+         self._stats(rec)
+
+   def _send(self, s, kind='cmd', keys=()):
+      if self._batch is not None:
+         self._batch.append((s, keys))
+         self._batchlen += len(s)
+         if self._batchsize and self._batchlen >= self._batchsize:
+            self._flushbatch()
+      elif self.queue:
+         self._enqueue([s, kind, keys])
+      else:
+         self._write(s)
+
+   def _flushbatch(self):
+      # send the collected commands at once
+      if self._batch:
+         batch, self._batch, self._batchlen = self._batch, [], 0
+         s = ''.join(str(s) for s, keys in batch)
+         keys = [key for s, keys in batch for key in keys]
+         if self.queue:
+            self._enqueue([s, 'cmd', keys])
+         else:
+            self._write(s)
+
+   @contextmanager
+   def batch(self, size=None):
+      '''
+      Collect all commands and data and send them in a single write at the end.
+
+      Parameters
+      ----------
+      size : int, optional
+          Flush earlier, when the collected commands exceed size (in characters).
+
+      With stderr, the messages of gnuplot are checked once at the end. If an
+      exception is raised in the block, the collected commands are discarded.
+
+      Examples
+      --------
+      >>> with gplot.batch():
+      ...    gplot.key_bottom_rev("left").xlabel('"x"').mxtics()
+      ...    gplot('sin(x)')
+      '''
+      if self._batch is not None:
+         # nested, the outer one sends
+         yield self
+         return
+      self._batch, self._batchsize, self._batchlen = [], size, 0
       try:
-          time.sleep(0.03) # if long the fifo cannot be read?
-          s = self.gnuplot.stderr.read()[:-1]
-          if s: print(s, end='')  # gnuplot already appends a newline
+         yield self
       except:
-          pass
+         batch, self._batch = self._batch, None
+         self._forget([key for s, keys in batch for key in keys])
+         raise
+      try:
+         self._flushbatch()
+      finally:
+         self._batch = None
+      if self.put == self.PUT:
+         self._check()
+
+   def _write(self, s):
+      out = sys.stdout if self.stdout else self.gnuplot.stdin
+      if isinstance(s, _Chunks):
+         s.writeto(out)
+      else:
+         out.write(s)
+
+   def _enqueue(self, item):
+      with self._cond:
+         self._raise()
+         if self.queue == 'coalesce' and item[1] == 'plot':
+            self._drop()   # a new plot supersedes the queued ones
+         while len(self._queue) >= self._qsize:
+            if self.queue != 'drop' or not self._drop():
+               self._cond.wait()
+         self._queue.append(item)
+         self._pending += 1
+         self._cond.notify_all()
+
+   def _drop(self):
+      # discard the oldest (drop) or all (coalesce) queued plots; returns False, if there are none
+      # (their data is kept in the cache, it was sent ahead or is in files)
+      groups = []
+      for i, (s, kind, keys) in enumerate(self._queue):
+         if kind == 'plot':
+            groups.append([i])
+         elif kind == 'oplot' and groups:
+            groups[-1].append(i)
+      drop = groups[:1] if self.queue == 'drop' else groups
+      drop = set(i for group in drop for i in group)
+      for i in sorted(drop, reverse=True):
+         del self._queue[i]
+         self._pending -= 1
+      return bool(drop)
+
+   def _forget(self, keys):
+      # the data did not reach gnuplot
+      for key in keys:
+         entry = self.cache.pop(key, None)
+         if entry and entry[3]:
+            entry[3].close()
+
+   def _writer(self):
+      # background thread for the queue; stops at the item None (close)
+      while True:
+         with self._cond:
+            while not self._queue:
+               self._cond.wait()
+            item = self._queue.popleft()
+            self._cond.notify_all()
+         if item is None:
+            return
+         s = item[0]
+         try:
+            self._write(s)
+         except Exception as e:
+            self._error = e
+         with self._cond:
+            self._pending -= 1
+            self._cond.notify_all()
+
+   def _raise(self):
+      # pass an error of the writer thread to the caller
+      if self._error:
+         e, self._error = self._error, None
+         raise e
+
+   def wait(self):
+      '''Wait until the queued commands are written to gnuplot.'''
+      if self.queue:
+         with self._cond:
+            while self._pending:
+               self._cond.wait()
+            self._raise()
+      return self
+
+   def done(self):
+      '''Awaitable for asyncio, e.g. "await gplot.done()". Resolves after wait().'''
+      import asyncio
+      return asyncio.get_event_loop().run_in_executor(None, self.wait)
+
+   def PUT(self, *args, **kwargs):
+      # same a _put, but catches the messages of gnuplot (stderr)
+      self._put(*args, **kwargs)
+      if self._batch is None:
+         self._check()
+      return self
+
+   def _check(self):
+      # gnuplot prints a marker after the command, so the messages up to it belong to the command
+      marker = 'gplot_%s_%d' % (os.getpid(), next(self._markers))
+      self._put('printerr "%s"' % marker)
+      gen = self._gen
+      msg = _readuntil(self.gnuplot.stderr, marker)
+      self._acked(gen)
+      if self._rec is not None:
+         self._rec['done'] = time.time() - self._rec['start']
+      if _iserror(msg):
+         raise GnuplotError(msg)
+      if msg: print(msg, end='')  # gnuplot already appends a newline
       return self
 
    # some plot commands (kwargs possible)
    def plot(self, *args, **kwargs):
-      self.og = 0; self.buf = ''; self.put('\n')        # reset
+      self.og = 0; self.buf = _Chunks(); self.put('\n')        # reset
       return self._plot('plot ', *args, **kwargs)
 
    def splot(self, *args, **kwargs):
-      self.og = 0; self.buf = ''; self.put('\n')        # reset
+      self.og = 0; self.buf = _Chunks(); self.put('\n')        # reset
       return self._plot('splot ', *args, **kwargs)
 
    def replot(self, *args, **kwargs):
@@ -215,13 +1179,24 @@ class Gplot(object):
    def array(self, **kwargs):
       # set gnuplot variables
       # gplot.array(A=[1, 2, 3], B=[4, 5, "6"])
-      for k,v in kwargs.items(): self.put("array %s[%d] = %s" % (k, len(v), list(v)))
-      return self
+      # large numeric arrays are sent as datablock and filled with one stats command
+      cmds = []
+      for k, v in kwargs.items():
+         if len(v) > self._bulk and np.asarray(v).dtype.kind in 'biuf':
+            cmds.append('$gplot_array <<EOD\n%sEOD\narray %s[%d]\n'
+                        'stats $gplot_array using (%s[int($0)+1] = $1, 0) name "GPLOT_ARRAY" nooutput\n'
+                        'undefine $gplot_array' % (_totext([v], '%.17g'), k, len(v), k))
+         else:
+            cmds.append("array %s[%d] = [%s]" % (k, len(v), ', '.join(_gpconst(x, quote=True) for x in v)))
+      return self.put('\n'.join(cmds)) if cmds else self
 
    def var(self, **kwargs):
-      # set gnuplot variables
-      for i in kwargs.items(): self.put("%s=%s" % i)
-      return self
+      # set gnuplot variables (in one write); arrays are passed to array
+      arrays = dict((k, v) for k, v in kwargs.items() if np.ndim(v) and not isinstance(v, (str, u''.__class__)))
+      cmds = ["%s=%s" % (k, _gpconst(v)) for k, v in kwargs.items() if k not in arrays]
+      if cmds:
+         self.put('\n'.join(cmds))
+      return self.array(**arrays)
 
    def __call__(self, *args, **kwargs):
       # by default plot mode is executed, but the user can change that
@@ -287,11 +1262,20 @@ class Iplot(Gplot):
    # '/usr/local/share/gnuplot/%s/js/' % Gplot.version
    # The path can be extracted from output of term svg mousing.
    # Request a small plot and parse the output
-   _jsdir = subprocess.check_output(['gnuplot', '-e', 'set term svg mousing; unset border; unset tics; set samp 2; pl [][0:1]NaN t ""'], universal_newlines=True).split('gnuplot_svg.js')[0].split('xlink:href="')[-1]
-   # universal_newlines=True leads finally to the same type|class=str in python 2 and python 3, instead of bytes
+   @_classlazy
+   def _jslocal(cls):
+      try:
+         jsdir = subprocess.check_output(['gnuplot', '-e', 'set term svg mousing; unset border; unset tics; set samp 2; pl [][0:1]NaN t ""'], universal_newlines=True).split('gnuplot_svg.js')[0].split('xlink:href="')[-1]
+      except (OSError, subprocess.CalledProcessError):
+         return ''
+      # universal_newlines=True leads finally to the same type|class=str in python 2 and python 3, instead of bytes
+      return jsdir if os.path.isdir(jsdir) else ''
 
    # The absolute path might not accessible in Jupyter, if localhost was
-   # started in local directory.
+   # started in local directory. Therefore, the scripts are read by python
+   # (once, preferably from the local installation) and inlined once per kernel.
+   _jscache = {}         # file name -> content
+   _jsinjected = set()   # already sent to the notebook
 
    # online locations:
    # latest version, including mouse wheel for zooming for svg:
@@ -299,6 +1283,34 @@ class Iplot(Gplot):
    # "http://gnuplot.sourceforge.net/demo_canvas_5.2/"
    # "http://gnuplot.sourceforge.net/demo_svg/"
 
+   # style the buttons and work around some mousing issues
+   _canvashead = '''
+<style>
+   img.icon-image {
+      max-width: None !important;
+   }
+   td.icon, td.mb0, td.mb1 {
+      background-color: #f7f7f7;
+      line-height: 16px;
+   }
+</style>
+<script type="text/javascript">
+   // to get correct mouse coords (overflow:auto, scrollTop)
+   document.getElementById("site").style.position = "sticky";
+</script>
+<script type="text/javascript">
+   // from view-source:http://gnuplot.sourceforge.net/demo_canvas/simple.html
+   var canvas, ctx;
+   gnuplot.grid_lines = true;
+   gnuplot.zoomed = false;
+   gnuplot.active_plot_name = "gnuplot_canvas";
+   gnuplot.active_plot = gnuplot.dummyplot;
+   gnuplot.help_URL = "http://gnuplot.sourceforge.net/demo_canvas_5.0/canvas_help.html";
+   gnuplot.dummyplot = function() {};
+   function gnuplot_canvas( plot ) { gnuplot.active_plot(); };
+</script>
+'''
+
    def __init__(self, *args, **kwargs):
       '''
       Iplot(*args, suffix='png', uri=True, cleanup=True, **kwargs)
@@ -313,15 +1325,27 @@ class Iplot(Gplot):
       opt : str, optional
           Additional terminal settings (e.g. 'size 300,200').
       uri : boolean, optional
-          If true, the figure will inline. A fifo is used, leading to a blocking
-          read and has no problem with waiting for termination of an asynchronous
-          process. It seems to be faster.
+          If true, the figure will inline. gnuplot writes the figure into a pipe
+          (/dev/fd), followed by a marker, so no file or fifo is needed. Otherwise
+          the received figure is written to the file. Without /dev/fd, a fifo is
+          used, leading to a blocking read.
       cleanup : boolean, optional
           If true (default), the temporary image file will be deleted. For uri=False,
           this may lead to non-existing file.
       jsdir : str, optional
           Path to gnuplot javascript library.
           (default: http://gnuplot.sourceforge.net/demo_canvas_cvs/)
+          For inline svg and canvas, the scripts are read once (from the local
+          gnuplot installation, if found) and inlined only in the first figure
+          of the kernel session.
+      imgcache : int, optional
+          Byte budget for a cache of inline figures (uri=True, except pdf). The key
+          is the plot command with the hashes of the data, the settings, the
+          terminal and the gnuplot version. On a hit, the figure is returned without
+          gnuplot; the settings are then sent only when a figure has to be rendered
+          (unless stderr is captured). Default is 0 (no cache).
+      cachedir : str, optional
+          Directory for a persistent cache (with the same budget).
       **kwargs : tmp (see Gplot).
 
       Examples
@@ -347,15 +1371,170 @@ class Iplot(Gplot):
       self.uri = kwargs.pop('uri', True)
       self.jsdir = kwargs.pop('jsdir', 'jsdir "%s"'% self._jsdir)
       self.cleanup = kwargs.pop('cleanup', True)
+      self.imgcache = kwargs.pop('imgcache', 0)
+      self.cachedir = kwargs.pop('cachedir', None)
+      self.imgstats = {'hits': 0, 'misses': 0}
+      self._imgs = OrderedDict()   # key -> (display class name, data)
+      self._state = []   # commands since the last reset
+      self._deferred = [] if self.imgcache and not kwargs.get('stderr') else None
+      self._rendering = False
       self.canvasnum = 0
+      self._capfd = None   # pipe (read end, write end in gnuplot) for the figures
+      if self.cachedir and not os.path.isdir(self.cachedir):
+         os.makedirs(self.cachedir)
       return super(Iplot, self).__init__(*args, **kwargs)
 
+   def _popen(self, cmdargs, stderr):
+      if not os.path.isdir('/dev/fd'):
+         return super(Iplot, self)._popen(cmdargs, stderr)
+      r, w = os.pipe()
+      if sys.version_info[0] > 2:
+         gnuplot = super(Iplot, self)._popen(cmdargs, stderr, pass_fds=(w,))
+      else:
+         gnuplot = super(Iplot, self)._popen(cmdargs, stderr, close_fds=False)
+      os.close(w)   # gnuplot has its own; EOF, if gnuplot dies
+      self._capfd = r, w
+      return gnuplot
+
+   def close(self):
+      super(Iplot, self).close()
+      if self._capfd:
+         os.close(self._capfd[0])
+         self._capfd = None
+
+   def _capture(self, term, *args, **kwargs):
+      # render into the pipe (no fifo, temporary file, or polling) and return the bytes
+      marker = ('gplot_%s_%d\n' % (os.getpid(), next(self._markers))).encode()
+      out = []
+      reader = threading.Thread(target=_readpipe, args=(self._capfd[0], marker, out))
+      reader.daemon = True
+      reader.start()
+      self._sendpending()
+      self._rendering = True
+      try:
+         self.term(term).out('"/dev/fd/%d"' % self._capfd[1])
+         super(Iplot, self)._plot(*args, **kwargs)
+      finally:
+         # also after an error, the reader must see the marker
+         self.out()
+         self.put('set print "/dev/fd/%d"; print "%s"; unset print' % (self._capfd[1], marker.decode().strip()))
+         self._rendering = False
+         self._flushbatch()   # the figure is needed now
+         reader.join()
+      return out[0]
+
+   @classmethod
+   def _jsread(cls, name):
+      # a gnuplot javascript file, read only once
+      if name not in cls._jscache:
+         if cls._jslocal and os.path.exists(cls._jslocal+name):
+            with open(cls._jslocal+name) as f:
+               cls._jscache[name] = f.read()
+         else:
+            try:
+               from urllib.request import urlopen
+            except ImportError:   # python 2
+               from urllib2 import urlopen
+            cls._jscache[name] = urlopen(cls._jsdir+name).read().decode('utf-8')
+      return cls._jscache[name]
+
+   def _jslib(self, suffix):
+      # the libraries for svg and canvas, only for the first figure in this kernel
+      if suffix in Iplot._jsinjected or suffix not in ('svg', 'html'):
+         return ''
+      if suffix == 'svg':
+         lib = '<script>\n%s\n</script>\n' % self._jsread('gnuplot_svg.js')
+      else:
+         lib = '<style>\n%s\n</style>\n' % self._jsread('gnuplot_mouse.css')
+         for name in ('canvastext.js', 'gnuplot_common.js', 'gnuplot_mouse.js'):
+            lib += '<script>\n%s\n</script>\n' % self._jsread(name)
+         lib += self._canvashead
+      Iplot._jsinjected.add(suffix)
+      return lib
+
+   def _send(self, s, kind='cmd', keys=()):
+      if self.imgcache and not self._rendering:
+         # track the settings for the image cache
+         if s.startswith('reset'):
+            del self._state[:]
+         # the stream of commands in the send order; a repeated set/unset only moves to the end
+         # (other commands, e.g. i = i+1, may not give the same state again)
+         if s.split()[:1] in (['set'], ['unset']) and s in self._state:
+            self._state.remove(s)
+         self._state.append(s)
+         if self._deferred is not None:
+            self._deferred.append(s)   # sent only, when a figure has to be rendered
+            return
+      super(Iplot, self)._send(s, kind, keys)
+
+   def _sendpending(self):
+      if self._deferred:
+         self._deferred, pending = [], self._deferred
+         super(Iplot, self)._send(''.join(pending))
+
+   def _imgkey(self, args, kwargs, suffix):
+      # hash of everything that determines the figure; None, if not possible
+      h = hashlib.sha1(repr((self.version, suffix, self.opt, self.jsdir, sorted(kwargs.items()))).encode())
+      for cmd in self._state:
+         h.update(cmd.encode())
+      for arg in args:
+         if isinstance(arg, (str, u''.__class__)):
+            h.update(arg.encode())
+         else:
+            key = _datakey((arg,))
+            if key is None:
+               return None
+            h.update(key.encode())
+      return h.hexdigest()
+
+   def _imgget(self, key, suffix):
+      from IPython.display import Image, HTML, SVG
+      if key in self._imgs:
+         self._imgs[key] = self._imgs.pop(key)   # most recently used
+      elif self.cachedir:
+         for name in ('Image', 'HTML', 'SVG'):
+            fname = os.path.join(self.cachedir, key+'.'+name)
+            if os.path.exists(fname):
+               os.utime(fname, None)
+               with open(fname, 'rb') as f:
+                  data = f.read()
+               self._imgadd(key, name, data if name == 'Image' else data.decode('utf-8'), disk=False)
+               break
+      if key not in self._imgs:
+         self.imgstats['misses'] += 1
+         return None
+      self.imgstats['hits'] += 1
+      name, data = self._imgs[key]
+      if name == 'HTML':
+         data = self._jslib(suffix) + data
+      return {'Image': Image, 'HTML': HTML, 'SVG': SVG}[name](data=data)
+
+   def _imgadd(self, key, name, data, disk=True):
+      self._imgs[key] = (name, data)
+      total = sum(len(data) for name, data in self._imgs.values())
+      while total > self.imgcache and len(self._imgs) > 1:
+         total -= len(self._imgs.popitem(last=False)[1][1])
+      if self.cachedir and disk:
+         with open(os.path.join(self.cachedir, key+'.'+name), 'wb') as f:
+            f.write(data if name == 'Image' else data.encode('utf-8'))
+         files = [os.path.join(self.cachedir, fname) for fname in os.listdir(self.cachedir)]
+         files.sort(key=os.path.getmtime)
+         total = sum(os.path.getsize(fname) for fname in files)
+         while total > self.imgcache and len(files) > 1:
+            total -= os.path.getsize(files[0])
+            os.remove(files.pop(0))
+
    def _plot(self, *args, **kwargs):
       '''
       filename : Output to a user specified file.
       '''
       if kwargs.get('flush') == '':
-          super(Iplot, self)._plot(*args, **kwargs)
+          self._sendpending()
+          self._rendering = True
+          try:
+             super(Iplot, self)._plot(*args, **kwargs)
+          finally:
+             self._rendering = False
           return
       self.canvasnum += 1
       uri = self.uri
@@ -384,27 +1563,41 @@ class Iplot(Gplot):
       if suffix=='html':
          imgfile = canvasname + '.js'
 
-      if uri:
+      key = None
+      if self.imgcache and uri and suffix != 'pdf' and self.flush != '' and args[:1] in (('plot ',), ('splot ',)):
+         # a new figure (not added to an accumulated or previous plot)
+         key = self._imgkey(args, kwargs, suffix)
+         img = key and self._imgget(key, suffix)
+         if img is not None:
+            return img
+
+      imgbytes = None
+      if self._capfd:
+         # gnuplot writes the figure into a pipe, framed by a marker
+         imgbytes = self._capture(term, *args, **kwargs)
+         if not uri or suffix == 'pdf' or not self.cleanup:
+            with open(imgfile, 'wb') as f:
+               f.write(imgbytes)
+      elif uri:
          # cleanup if already exists
          os.system("rm -f "+imgfile)
          os.mkfifo(imgfile)
 
-      self.term(term).out('"%s"' % imgfile)
-      if uri:
-         # the fifo needs something to read; but display will finally open and read imgfile
-         fifo = open(imgfile, 'r')
-      super(Iplot, self)._plot(*args, **kwargs)
-      self.out()
-
-      if uri:
-         1
-         #imgdata = fifo.read()
-         #imgfile = 'data:image/png;base64,'+
-         #imgdata = open(imgfile, "rb").read() # png needs rb, but imgfile can be also passed directly
-         #imgdata.replace('<svg ','<script type="text/javascript" xmlns:xlink="http://www.w3.org/1999/xlink" xlink:href="./gp/gnuplot_svg.js"></script>\n<svg ')
-         #import base64
-         #print (base64.b64encode(imgdata).decode('ascii')[-10:])
-      if not uri:
+      if not self._capfd:
+         self._sendpending()
+         self._rendering = True
+         try:
+            self.term(term).out('"%s"' % imgfile)
+            if uri:
+               self._flushbatch()
+               # the fifo needs something to read; but display will finally open and read imgfile
+               fifo = open(imgfile, 'r')
+            super(Iplot, self)._plot(*args, **kwargs)
+            self.out()
+         finally:
+            self._rendering = False
+
+      if not uri and not self._capfd:
          import time
          counter = 0
          while counter<100 and not (os.path.exists(imgfile) and os.system("lsof "+imgfile)):
@@ -414,9 +1607,9 @@ class Iplot(Gplot):
          if not self.cleanup:
             print(counter, imgfile, os.path.exists(imgfile), os.system("lsof "+imgfile))
 
-      imgdata = imgfile
+      imgdata = imgbytes if uri and imgbytes is not None and suffix != 'pdf' else imgfile
 
-      from IPython.display import Image, SVG, IFrame, HTML, Javascript
+      from IPython.display import Image, SVG, IFrame, HTML, Javascript, display
       showfunc = {'svg':SVG, 'html':HTML, 'pdf': IFrame}.get(suffix, Image)
       showargs = {'width': 600, 'height': 300} if showfunc == IFrame else {}
 
@@ -426,18 +1619,11 @@ class Iplot(Gplot):
             imgdata = '<embed src="%s" type="image/svg+xml">' % imgfile
          else:
             showfunc = HTML
-            imgdata = open(imgfile).read() # .replace("onload","onclick")
+            imgdata = imgbytes.decode('utf-8') if imgbytes is not None else open(imgfile).read() # .replace("onload","onclick")
             # to get mousing in chrome uncomment in gnuplot_svg.js:63
             # // p.x = evt.pageX; p.y = evt.pageY;
-            if self._jsdir.startswith("http://"):
-               from urllib.request import urlopen
-               gnuplot_svg_js = urlopen(self._jsdir+"gnuplot_svg.js").read().decode('utf-8')
-            else:
-               gnuplot_svg_js = open(self._jsdir+"gnuplot_svg.js").read()
-            gnuplot_svg_js.replace("documentElement", 'getElementsByTagName("svg")[0]')
             imgdata = ('''
      <script>
-''' + gnuplot_svg_js + '''
         // manually gnuplot_svg.Init (onload does not fire?)
         gnuplot_svg.SVGDoc = document.getElementsByTagName("svg")[0];
         console.log(gnuplot_svg.SVGRoot, gnuplot_svg.SVGDoc);
@@ -447,39 +1633,10 @@ class Iplot(Gplot):
 
       if suffix=='html':
          if uri:
-            imgdata = '<script>%s</script>' % open(imgfile).read()
+            imgdata = '<script>%s</script>' % (imgbytes.decode('utf-8') if imgbytes is not None else open(imgfile).read())
          else:
             imgdata = '''<script src="%s"></script>''' % imgfile
-         # style the buttons and work around some mousing issues
          imgdata = '''
-         <link rel="stylesheet" href="%sgnuplot_mouse.css" type="text/css">
-<style>
-   img.icon-image {
-      max-width: None !important;
-   }
-   td.icon, td.mb0, td.mb1 {
-      background-color: #f7f7f7;
-      line-height: 16px;
-   }
-</style>
-<script src="%scanvastext.js"></script>
-<script src="%sgnuplot_common.js"></script>
-<script src="%sgnuplot_mouse.js"></script>
-<script type="text/javascript">
-   // to get correct mouse coords (overflow:auto, scrollTop)
-   document.getElementById("site").style.position = "sticky";
-</script>
-<script type="text/javascript">
-   // from view-source:http://gnuplot.sourceforge.net/demo_canvas/simple.html
-   var canvas, ctx;
-   gnuplot.grid_lines = true;
-   gnuplot.zoomed = false;
-   gnuplot.active_plot_name = "gnuplot_canvas";
-   gnuplot.active_plot = gnuplot.dummyplot;
-   gnuplot.help_URL = "http://gnuplot.sourceforge.net/demo_canvas_5.0/canvas_help.html";
-   gnuplot.dummyplot = function() {};
-   function gnuplot_canvas( plot ) { gnuplot.active_plot(); };
-</script>
          %s
 <table class="noborder" style="margin-top:0; border:0;">
   <tr style="border:0;">
@@ -519,20 +1676,575 @@ class Iplot(Gplot):
            $('body').on('contextmenu', '#%s', function(e){ return false; });
       </script>
 
-            ''' % ((self._jsdir,)*4 + (imgdata,) + (self._jsdir,)*5 + (canvasname,)*12)
+            ''' % ((imgdata,) + (self._jsdir,)*5 + (canvasname,)*12)
 
       #print(imgdata)
-      img = showfunc(imgdata, **showargs)
+      if suffix == 'html' or suffix == 'svg' and uri:
+         img = showfunc(self._jslib(suffix) + imgdata)
+         if key:
+            self._imgadd(key, 'HTML', imgdata)   # without the libraries
+      else:
+         img = showfunc(imgdata, **showargs)
+         if key:
+            self._imgadd(key, type(img).__name__, img.data)
       if self.cleanup and not filename and not (suffix=='svg' and not uri):
-         os.system("rm -f "+imgfile)
+         if os.path.exists(imgfile):
+            os.remove(imgfile)
          # print(counter, end='\r')
          # print(counter, imgfile, os.path.exists(imgfile), os.system("lsof "+imgfile))
       else:
          display(HTML('<a href="%s">%s</a>' % (imgfile, imgfile)))
       return img
 
-# a default instance
-gplot = Gplot()
-ogplot = gplot.oplot
+class Gjob(Gplot):
+   '''
+   A recorded gnuplot job.
+
+   The class is similar as Gplot, but the commands and data are collected in the
+   attribute script instead of being sent to gnuplot. Jobs can be rendered with Gpool.
+   Data is inline by default (tmp='$'); temporary files live as long as the job.
+
+   Examples
+   --------
+   >>> job = Gjob().xlabel('"x"')
+   >>> job([1, 4, 2, 3], 'w lp')
+   >>> print(''.join(job.script))
+   '''
+   _reuse = False   # the script refers to all files
+
+   def __init__(self, *args, **kwargs):
+      self.script = []
+      super(Gjob, self).__init__(*args, **kwargs)
+
+   def _popen(self, cmdargs, stderr):
+      return None
+
+   def _write(self, s):
+      self.script.append(str(s))
+
+
+class Gpool(object):
+   '''
+   A pool of gnuplot processes to render jobs into files in parallel.
+
+   The gnuplot processes are started on demand and reused for the next jobs
+   (with reset in between).
+
+   Parameters
+   ----------
+   n : int, optional
+       Number of gnuplot processes. Default is the number of cores.
+   term : str, optional
+       Terminal for the output files. Default is 'pngcairo'.
+   cmdargs : str, optional
+       Arguments for gnuplot.
+
+   Examples
+   --------
+   >>> pool = Gpool()
+   >>> job = Gjob().xlabel('"x"')
+   >>> job([1, 4, 2, 3], 'w lp')
+   >>> future = pool.submit(job, 'fig.png')
+   >>> future.result()   # raises GnuplotError, if gnuplot reported one
+   'fig.png'
+   >>> pool.close()
+   '''
+   def __init__(self, n=None, term='pngcairo', cmdargs=''):
+      from concurrent.futures import ThreadPoolExecutor
+      self.term = term
+      self.cmdargs = cmdargs
+      self._idle = Queue()
+      self._markers = itertools.count()
+      self._executor = ThreadPoolExecutor(n or multiprocessing.cpu_count())
+
+   def submit(self, job, filename, term=None):
+      '''
+      Render a job (Gjob or script string) into filename. Returns a future.
+      '''
+      return self._executor.submit(self._render, job, filename, term or self.term)
+
+   def _render(self, job, filename, term):
+      try:
+         gp = self._idle.get_nowait()
+      except Empty:
+         gp = None
+      if not gp or gp.poll() is not None:
+         gp = subprocess.Popen('gnuplot '+self.cmdargs, shell=True, stdin=subprocess.PIPE,
+                   stderr=subprocess.PIPE, universal_newlines=True, bufsize=0)
+      script = job if isinstance(job, str) else ''.join(job.script)
+      marker = 'gplot_job_%d' % next(self._markers)
+      try:
+         gp.stdin.write('set term %s\nset output "%s"\n%s\nset output\nreset\nprinterr "%s"\n' % (term, filename, script, marker))
+         err = _readuntil(gp.stderr, marker)
+      except Exception:
+         gp.kill()
+         raise
+      self._idle.put(gp)
+      if _iserror(err):
+         raise GnuplotError(err)
+      return filename
+
+   def close(self):
+      '''Wait for the jobs and terminate the gnuplot processes.'''
+      self._executor.shutdown()
+      while not self._idle.empty():
+         gp = self._idle.get()
+         gp.stdin.close()
+         gp.wait()
+
+   def __enter__(self):
+      return self
+
+   def __exit__(self, *args):
+      self.close()
+
+
+class Gmultiplot(object):
+   '''
+   A grid of panels (multiplot), sent as one script with all data in front.
+
+   The panels are given with the arguments of the call method of Gplot (arrays and
+   options) and their settings as keywords. The data of all panels is passed as inline
+   datablocks: curves with the same x (by content and length) share a datablock with x
+   and their columns, which they select with using; identical columns are stored once.
+   Curves with a single column or their own using get a datablock of their own (also
+   shared by identical curves).
+
+   Parameters
+   ----------
+   rows, cols : int
+       Layout of the grid (rows first).
+   opt : str, optional
+       Further options for set multiplot, e.g. 'title "dashboard" spacing 0.05'.
+   fmt : str, optional
+       Format for numeric data (see Gplot).
+
+   Examples
+   --------
+   >>> x = np.linspace(0, 10, 1000)
+   >>> m = Gmultiplot(2, 3, 'title "dashboard"')
+   >>> m.panel(0, 0, x, np.sin(x), 'w l t "sin"', xlabel='"t"', logscale_y=True)
+   >>> m[0, 1] = x, np.cos(x), 'w l t "cos"'   # x is sent once
+   >>> m.plot(Gplot())   # one write: datablocks and multiplot
+   >>> Gpool().submit(m.script(), 'dashboard.png')
+   >>> m.export('panel_%d_%d.png')   # each panel into a file, in parallel
+   '''
+   def __init__(self, rows, cols, opt='', fmt='%s'):
+      self.rows = rows
+      self.cols = cols
+      self.opt = opt
+      self.fmt = fmt
+      self.panels = {}   # (row, col) -> (args, settings)
+
+   def panel(self, row, col, *args, **settings):
+      '''
+      Set a panel. args as for Gplot.plot, settings as keywords, e.g. xlabel='"t"' or
+      key_left=True (underscores are blanks). Each panel starts with reset, i.e. with the
+      defaults and only its own settings.
+      '''
+      self.panels[row, col] = (args, settings)
+      return self
+
+   def __setitem__(self, index, args):
+      self.panel(index[0], index[1], *(args if isinstance(args, tuple) else (args,)))
+
+   def _ref(self, groups, data, opt):
+      # the datablock (and columns) for a curve
+      keys = [_datakey((col,)) for col in data]
+      n = set(len(col) for col in data)
+      if len(data) < 2 or None in keys or len(n) > 1 or re.match(r'\s*us', opt):
+         key = ('curve',) + tuple(keys) if None not in keys else ('curve', len(groups))
+         if key not in groups:
+            groups[key] = ['$mp%d' % len(groups), list(data), None]
+         return groups[key][0]
+      group = groups.setdefault(('x', keys[0], n.pop()), ['$mp%d' % len(groups), [data[0]], [keys[0]]])
+      using = []
+      for col, key in zip(data[1:], keys[1:]):
+         if key not in group[2]:
+            group[1].append(col)
+            group[2].append(key)
+         using.append(str(group[2].index(key)+1))
+      return '%s us 1:%s' % (group[0], ':'.join(using))
+
+   def _script(self, panels):
+      # datablocks and the commands of each panel
+      groups = OrderedDict()   # key -> [name, columns, column keys]
+      cmds = {}
+      for rc in panels:
+         args, settings = self.panels[rc]
+         pl = ''
+         data = ()
+         for arg in args + ('',):
+            if isinstance(arg, (str, u''.__class__)):
+               if data:
+                  pl += self._ref(groups, data, arg) + ' '
+               pl += arg
+               data = ()
+            else:
+               data += _argcols(arg)
+         names = sorted(settings)
+         # reset: the settings of the previous panel do not leak (unset would not restore the defaults)
+         cmds[rc] = ''.join(['reset\n'] +
+                            [('set %s %s' % (name.replace('_', ' '), '' if settings[name] is True else settings[name])).rstrip() + '\n' for name in names] +
+                            ['plot %s\n' % pl]) if pl else 'set multiplot next\n'
+      blocks = ''.join('%s <<EOD\n%sEOD\n' % (name, _totext(cols, self.fmt)) for name, cols, keys in groups.values())
+      return blocks, cmds
+
+   def script(self):
+      '''The multiplot as gnuplot script (datablocks and commands).'''
+      blocks, cmds = self._script(sorted(self.panels))
+      lines = [blocks, 'set multiplot layout %d,%d %s\n' % (self.rows, self.cols, self.opt)]
+      for i in range(self.rows):
+         for j in range(self.cols):
+            lines.append(cmds.get((i, j), 'set multiplot next\n'))
+      lines.append('unset multiplot\n')
+      return ''.join(lines)
+
+   def plot(self, gp=None):
+      '''Send the multiplot in a single batch to gp (default: gplot). Returns gp.'''
+      gp = gp or gplot
+      with gp.batch():
+         gp.put(self.script(), end='')
+      return gp
+
+   def export(self, pattern, pool=None, term=None):
+      '''
+      Render each panel as a figure into the file pattern % (row, col) with a Gpool
+      (default: a temporary one, which is closed after the jobs).
+      Returns a dict of futures (see Gpool.submit) by (row, col).
+      '''
+      own = pool is None
+      pool = pool or Gpool()
+      futures = {}
+      for rc in sorted(self.panels):
+         blocks, cmds = self._script([rc])
+         futures[rc] = pool.submit(blocks + cmds[rc], pattern % rc, term)
+      if own:
+         pool.close()
+      return futures
+
+
+class _Session(object):
+   # a gnuplot session of a Gserver with the interface of the Popen object
+   # (stdin: commands and data, stderr: messages, wait: end of the session)
+   encoding = 'utf-8'
+
+   def __init__(self, address, stderr=None):
+      import socket
+      self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+      self._sock.connect(address)
+      self.stdin = self
+      self.stderr = self._sock.makefile('r')
+      self.closed = False
+      self.returncode = None
+      greeting = self.stderr.readline().split()   # gplot version pid
+      if greeting[:1] != ['gplot']:
+         raise GnuplotError('no gplot server at %s' % address)
+      self.version, self.pid = float(greeting[1]), int(greeting[2])
+      self.write("cd %s\n" % _gpconst(os.getcwd(), quote=True))   # relative paths as in the client
+      self._reader = None
+      if not stderr:
+         # as gnuplot's own stderr, the messages go to the console
+         self._reader = threading.Thread(target=lambda: [sys.stderr.write(line) for line in iter(self.stderr.readline, '')])
+         self._reader.daemon = True
+         self._reader.start()
+
+   def write(self, s):
+      self._sock.sendall(s if isinstance(s, bytes) else s.encode(self.encoding))
+
+   def flush(self):
+      pass
+
+   def fileno(self):
+      return self._sock.fileno()
+
+   def close(self):
+      # end of the session; the server resets the gnuplot
+      import socket
+      if not self.closed:
+         self.closed = True
+         self._sock.shutdown(socket.SHUT_WR)
+
+   def poll(self):
+      return self.returncode
+
+   def wait(self):
+      self.close()
+      if self._reader:
+         self._reader.join()
+      else:
+         for line in iter(self.stderr.readline, ''):
+            pass
+      self._sock.close()
+      self.returncode = 0
+      return 0
+
+   def kill(self):
+      self.closed = True
+      self._sock.close()
+      self.returncode = -signal.SIGTERM
+
+
+class Gserver(object):
+   '''
+   A gnuplot server for many (short-lived) processes.
+
+   The server listens on a Unix socket and hands out sessions to the connecting clients,
+   Gplot(server=address). Each session gets a gnuplot process of the pool for itself;
+   the processes are started on demand and reused. When the client disconnects, pending
+   data is terminated, output and terminal are restored, and the session is reset
+   (reset session), so the next client does not see its settings, variables, or data.
+   A session runs in the working directory of the client (relative paths as for a local
+   gnuplot); afterwards, the directory of the server is restored.
+   Clients beyond n wait for a free process. Messages (stderr) are sent back to the
+   client; the term output of gnuplot (stdout) goes to the server's stdout.
+
+   Parameters
+   ----------
+   address : str
+       Path of the Unix socket.
+   n : int, optional
+       Number of gnuplot processes (concurrent sessions). Default is the number of cores.
+   cmdargs : str, optional
+       Arguments for gnuplot.
+   timeout : float, optional
+       Time for gnuplot to finish a session after the disconnect (e.g. a pending pause).
+       Otherwise, the process is killed. Default is 10 s.
+
+   Examples
+   --------
+   >>> server = Gserver('/tmp/gplot.sock').start()   # or: python gplot.py /tmp/gplot.sock
+   >>> g = Gplot(server='/tmp/gplot.sock')   # in the client processes
+   >>> g.term('pngcairo').out('"fig.png"')([1, 4, 2, 3], 'w lp')
+   >>> g.close()   # end of the session
+   >>> server.close()
+   '''
+   def __init__(self, address, n=None, cmdargs='', timeout=10):
+      import socket
+      self.address = address
+      self.cmdargs = cmdargs
+      self.timeout = timeout
+      self.cwd = os.getcwd()   # restored after each session (clients change to theirs)
+      self._idle = Queue()
+      self._slots = threading.Semaphore(n or multiprocessing.cpu_count())
+      self._markers = itertools.count()
+      if os.path.exists(address):
+         os.remove(address)   # a stale socket
+      self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+      self._sock.bind(address)
+      self._sock.listen(64)
+      self._thread = None
+
+   def serve_forever(self):
+      '''Accept clients until close(); each session is served in a thread.'''
+      import socket
+      while True:
+         try:
+            conn, addr = self._sock.accept()
+         except (socket.error, OSError):
+            break   # closed
+         t = threading.Thread(target=self._serve, args=(conn,))
+         t.daemon = True
+         t.start()
+
+   def start(self):
+      '''Serve in a background thread.'''
+      self._thread = threading.Thread(target=self.serve_forever)
+      self._thread.daemon = True
+      self._thread.start()
+      return self
+
+   def _gnuplot(self):
+      try:
+         gp = self._idle.get_nowait()
+      except Empty:
+         gp = None
+      if not gp or gp.poll() is not None:
+         gp = subprocess.Popen('gnuplot '+self.cmdargs, shell=True, stdin=subprocess.PIPE,
+                   stderr=subprocess.PIPE, bufsize=0)
+         gp.stdin.write(b'set term push\n')   # the default terminal, restored after each session
+      return gp
+
+   def _serve(self, conn):
+      with self._slots:
+         gp = self._gnuplot()
+         marker = ('gplot_session_%d' % next(self._markers)).encode()
+         def relay():
+            # gnuplot's messages to the client up to the end marker of the session
+            for line in iter(gp.stderr.readline, b''):
+               if line.rstrip(b'\n') == marker:
+                  return
+               try:
+                  conn.sendall(line)
+               except (IOError, OSError):
+                  pass   # the client is gone; drain
+         t = threading.Thread(target=relay)
+         t.daemon = True
+         t.start()
+         try:
+            conn.sendall(('gplot %s %d\n' % (Gplot.version, gp.pid)).encode())
+            for chunk in iter(lambda: conn.recv(2**16), b''):
+               gp.stdin.write(chunk)
+         except (IOError, OSError):
+            pass
+         try:
+            # terminate a datablock or inline data, restore output, terminal, and directory, and reset
+            reset = 'reset session' if Gplot.version >= 5 else 'reset'
+            gp.stdin.write(('\nEOD\ne\nset output\nset term pop\nset term push\n%s\ncd %s\nprinterr "%s"\n' %
+                            (reset, _gpconst(self.cwd, quote=True), marker.decode())).encode())
+         except (IOError, OSError):
+            pass
+         t.join(self.timeout)
+         if t.is_alive() or gp.poll() is not None:
+            gp.kill()   # busy or died; a new one for the next session
+         else:
+            self._idle.put(gp)
+         conn.close()
+
+   def close(self):
+      '''Stop accepting and terminate the idle gnuplot processes.'''
+      import socket
+      try:
+         self._sock.shutdown(socket.SHUT_RDWR)
+      except (socket.error, OSError):
+         pass
+      self._sock.close()
+      if os.path.exists(self.address):
+         os.remove(self.address)
+      while not self._idle.empty():
+         gp = self._idle.get()
+         gp.stdin.close()
+         gp.wait()
+
+   def __enter__(self):
+      return self
+
+   def __exit__(self, *args):
+      self.close()
+
+
+class Gstream(object):
+   '''
+   Live plot of streamed samples.
+
+   The last n samples are kept in a ring buffer. Only new samples are appended to a
+   data file (in /dev/shm, if available), which gnuplot reads on each frame skipping
+   the older lines (every ::skip). Once the file holds 2n lines, it is rewritten from
+   the ring buffer. Frames are drawn at most with the rate fps.
+
+   Parameters
+   ----------
+   n : int
+       Number of samples kept.
+   curves : int or list of str, optional
+       Number of curves or their plot options (default: 'w l').
+   fps : float, optional
+       Maximum frame rate. Default is 25.
+   gp : Gplot, optional
+       The plot instance (default: a new one).
+   fmt : str, optional
+       Format for the samples (see Gplot).
+
+   Attributes
+   ----------
+   rate : float
+       Achieved frame rate (moving average).
+   frames : int
+       Number of drawn frames.
+   dropped : int
+       Number of appends without a frame due to the rate limit.
+
+   Examples
+   --------
+   >>> s = Gstream(1000, ['w l t "sin"', 'w l t "cos"'])
+   >>> for t in np.arange(0, 100, 0.01):
+   ...    s.append(t, [np.sin(t), np.cos(t)])
+   >>> s.draw()   # the last samples
+   '''
+   def __init__(self, n, curves=1, fps=25, gp=None, fmt='%.7g'):
+      self.n = n
+      self.curves = ['w l']*curves if isinstance(curves, int) else list(curves)
+      self.fps = fps
+      self.gp = gp or Gplot()
+      self.fmt = fmt
+      self.buf = np.empty((n, 1+len(self.curves)))
+      self.count = 0   # number of samples so far
+      self.lines = 0   # number of lines in the file
+      self.file = tempfile.NamedTemporaryFile('w', dir=_shmdir, prefix='gplot_', suffix='.dat')
+      self.rate = 0.
+      self.frames = 0
+      self.dropped = 0
+      self._last = None
+
+   def append(self, t, y):
+      '''
+      Append a sample or a batch of samples.
+
+      t : scalar or array of length m
+      y : sample(s) with shape (m, curves); (m,) for a single curve
+      '''
+      t = np.atleast_1d(t)
+      rows = np.column_stack((t, np.asarray(y, dtype=float).reshape(len(t), -1)))
+      m = len(rows)
+      if rows.shape[1] != self.buf.shape[1]:
+         raise ValueError('expected %d curves, got %d' % (len(self.curves), rows.shape[1]-1))
+      self.buf[(self.count + np.arange(max(m-self.n, 0), m)) % self.n] = rows[-self.n:]
+      self.count += m
+      if self.lines + m > 2*self.n:
+         # compact the file to the ring buffer
+         self.file.seek(0)
+         self.file.truncate()
+         rows = self.samples()
+         self.lines = 0
+      self.file.write(_totext(rows.T, self.fmt))
+      self.file.flush()
+      self.lines += len(rows)
+      if self._last is None or time.time()-self._last >= 1./self.fps:
+         self.draw()
+      else:
+         self.dropped += 1
+      return self
+
+   def samples(self):
+      '''The samples in the ring buffer in chronological order.'''
+      if self.count <= self.n:
+         return self.buf[:self.count]
+      i = self.count % self.n
+      return np.concatenate((self.buf[i:], self.buf[:i]))
+
+   def draw(self):
+      '''Draw a frame.'''
+      now = time.time()
+      if self._last is not None and now > self._last:
+         self.rate = 0.9*self.rate + 0.1/(now-self._last) if self.frames > 1 else 1./(now-self._last)
+      self._last = now
+      self.frames += 1
+      skip = max(self.lines-self.n, 0)
+      self.gp.plot(', '.join('"%s" every ::%d us 1:%d %s' % (self.file.name, skip, i+2, opt)
+                             for i, opt in enumerate(self.curves)))
+      return self
+
+   def close(self):
+      self.file.close()
+
+
+# a default instance (started on first use)
+gplot = _Default(Gplot)
+
+def ogplot(*args, **kwargs):
+   return gplot.oplot(*args, **kwargs)
 
 
+if __name__ == "__main__":
+   # a gnuplot server: python gplot.py /tmp/gplot.sock [-n 4]
+   import argparse
+   parser = argparse.ArgumentParser(description='gnuplot server for Gplot(server=address)')
+   parser.add_argument('address', help='path of the Unix socket')
+   parser.add_argument('-n', type=int, help='number of gnuplot processes (default: cores)')
+   parser.add_argument('--cmdargs', default='', help='arguments for gnuplot')
+   opt = parser.parse_args()
+   server = Gserver(opt.address, opt.n, opt.cmdargs)
+   try:
+      server.serve_forever()
+   except KeyboardInterrupt:
+      server.close()